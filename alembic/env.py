@@ -30,6 +30,7 @@ if config.config_file_name is not None:
 import os
 import sys
 sys.path.append(os.getcwd())
+import database
 import models
 target_metadata = models.Base.metadata
 
@@ -70,10 +71,14 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # A one-off run needs no pool, and long DDL must not hit the app's
+    # statement timeout, so only the application name is taken over
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
+        connect_args=database.connect_args(config.get_main_option("sqlalchemy.url"),
+                                           "sales-analytics-migrations"),
     )
 
     with connectable.connect() as connection:
@@ -0,0 +1,149 @@
+"""baseline star schema
+
+The tables as main.py used to create them with create_all. Databases that
+already have them should be stamped instead of upgraded:
+
+    alembic stamp 0001
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'dim_date',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('quarter', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Integer(), nullable=False),
+        sa.Column('month_name', sa.String(length=20), nullable=False),
+        sa.Column('day_name', sa.String(length=20), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('date'),
+    )
+    op.create_index('ix_dim_date_id', 'dim_date', ['id'])
+
+    op.create_table(
+        'dim_category',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_index('ix_dim_category_id', 'dim_category', ['id'])
+
+    op.create_table(
+        'dim_product',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('business_id', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('brand', sa.String(length=100), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['dim_category.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_dim_product_id', 'dim_product', ['id'])
+
+    op.create_table(
+        'dim_manager',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_index('ix_dim_manager_id', 'dim_manager', ['id'])
+
+    op.create_table(
+        'dim_supplier',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('country', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_dim_supplier_id', 'dim_supplier', ['id'])
+
+    op.create_table(
+        'dim_region',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('region_name', sa.String(length=100), nullable=False),
+        sa.Column('city', sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_dim_region_id', 'dim_region', ['id'])
+
+    op.create_table(
+        'fact_sales',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sale_id', sa.Integer(), nullable=False),
+        sa.Column('date_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('manager_id', sa.Integer(), nullable=False),
+        sa.Column('supplier_id', sa.Integer(), nullable=False),
+        sa.Column('region_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('discount', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('revenue', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('payment_type', sa.String(length=50), nullable=True),
+        sa.Column('sales_channel', sa.String(length=50), nullable=True),
+        sa.ForeignKeyConstraint(['date_id'], ['dim_date.id']),
+        sa.ForeignKeyConstraint(['product_id'], ['dim_product.id']),
+        sa.ForeignKeyConstraint(['manager_id'], ['dim_manager.id']),
+        sa.ForeignKeyConstraint(['supplier_id'], ['dim_supplier.id']),
+        sa.ForeignKeyConstraint(['region_id'], ['dim_region.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sale_id'),
+    )
+    op.create_index('ix_fact_sales_id', 'fact_sales', ['id'])
+
+    op.create_table(
+        'oltp_sales',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sale_id', sa.Integer(), nullable=False),
+        sa.Column('sale_datetime', sa.String(length=50), nullable=False),
+        sa.Column('region_name', sa.String(length=100), nullable=False),
+        sa.Column('city', sa.String(length=100), nullable=False),
+        sa.Column('manager', sa.String(length=100), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=255), nullable=False),
+        sa.Column('brand', sa.String(length=100), nullable=True),
+        sa.Column('category', sa.String(length=100), nullable=False),
+        sa.Column('supplier_name', sa.String(length=100), nullable=False),
+        sa.Column('supplier_country', sa.String(length=100), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('discount', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('revenue', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('payment_type', sa.String(length=50), nullable=True),
+        sa.Column('sales_channel', sa.String(length=50), nullable=True),
+        sa.Column('transferred', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_oltp_sales_id', 'oltp_sales', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_table('oltp_sales')
+    op.drop_table('fact_sales')
+    op.drop_table('dim_region')
+    op.drop_table('dim_supplier')
+    op.drop_table('dim_manager')
+    op.drop_table('dim_product')
+    op.drop_table('dim_category')
+    op.drop_table('dim_date')
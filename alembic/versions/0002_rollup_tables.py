@@ -0,0 +1,63 @@
+"""monthly rollup and running totals
+
+agg_sales_monthly and sales_totals, maintained by rollups.py. Skipped for
+tables create_all already made; main.py fills them on startup.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('agg_sales_monthly'):
+        op.create_table(
+            'agg_sales_monthly',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('year', sa.Integer(), nullable=False),
+            sa.Column('quarter', sa.Integer(), nullable=False),
+            sa.Column('month', sa.Integer(), nullable=False),
+            sa.Column('month_name', sa.String(length=20), nullable=False),
+            sa.Column('region_id', sa.Integer(), nullable=False),
+            sa.Column('category_id', sa.Integer(), nullable=False),
+            sa.Column('manager_id', sa.Integer(), nullable=False),
+            sa.Column('supplier_id', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Numeric(precision=16, scale=2), nullable=False),
+            sa.Column('quantity', sa.BigInteger(), nullable=False),
+            sa.Column('discount', sa.Numeric(precision=16, scale=2), nullable=False),
+            sa.Column('unit_price', sa.Numeric(precision=16, scale=2), nullable=False),
+            sa.Column('sale_count', sa.BigInteger(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('year', 'month', 'region_id', 'category_id', 'manager_id', 'supplier_id',
+                                name='uq_agg_sales_monthly_grain'),
+        )
+        op.create_index('ix_agg_sales_monthly_id', 'agg_sales_monthly', ['id'])
+    if not inspector.has_table('sales_totals'):
+        op.create_table(
+            'sales_totals',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Numeric(precision=18, scale=2), nullable=False),
+            sa.Column('quantity', sa.BigInteger(), nullable=False),
+            sa.Column('discount', sa.Numeric(precision=18, scale=2), nullable=False),
+            sa.Column('unit_price', sa.Numeric(precision=18, scale=2), nullable=False),
+            sa.Column('sale_count', sa.BigInteger(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('sales_totals')
+    op.drop_table('agg_sales_monthly')
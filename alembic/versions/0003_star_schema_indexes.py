@@ -0,0 +1,78 @@
+"""star schema indexes and natural key constraints
+
+Foreign key indexes on fact_sales and dim_product, covering composite
+indexes for the day-level report shapes, OLTP lookup indexes, and unique
+constraints (a filtered unique index for the nullable product business_id)
+on the dimension natural keys so ETL can upsert with ON CONFLICT. Duplicate dimension members must be merged before upgrading.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COVERED_MEASURES = ['quantity', 'revenue']
+
+# (name, table, columns, covering columns)
+INDEXES = [
+    ('ix_fact_sales_date_product', 'fact_sales', ['date_id', 'product_id'], COVERED_MEASURES),
+    ('ix_fact_sales_region_date', 'fact_sales', ['region_id', 'date_id'], COVERED_MEASURES),
+    ('ix_fact_sales_manager_date', 'fact_sales', ['manager_id', 'date_id'], COVERED_MEASURES),
+    ('ix_fact_sales_product_revenue', 'fact_sales', ['product_id', 'revenue'], None),
+    ('ix_fact_sales_supplier_id', 'fact_sales', ['supplier_id'], None),
+    ('ix_dim_product_category_id', 'dim_product', ['category_id'], None),
+    ('ix_oltp_sales_sale_id', 'oltp_sales', ['sale_id'], None),
+    ('ix_oltp_sales_transferred', 'oltp_sales', ['transferred'], None),
+]
+
+# (name, table, columns)
+UNIQUE_CONSTRAINTS = [
+    ('uq_dim_supplier_name', 'dim_supplier', ['name']),
+    ('uq_dim_region_name_city', 'dim_region', ['region_name', 'city']),
+]
+
+# (name, table, columns, filter): unique over the rows matching filter.
+# Keys that may be NULL need the filter, since SQL Server's unique
+# constraints allow only one NULL
+UNIQUE_INDEXES = [
+    ('uq_dim_product_business_id', 'dim_product', ['business_id'], 'business_id IS NOT NULL'),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in UNIQUE_CONSTRAINTS:
+        if name not in {c['name'] for c in inspector.get_unique_constraints(table)}:
+            # Batch mode recreates the table where ALTER cannot add constraints (SQLite)
+            with op.batch_alter_table(table) as batch:
+                batch.create_unique_constraint(name, columns)
+    for name, table, columns, where in UNIQUE_INDEXES:
+        if name not in {i['name'] for i in inspector.get_indexes(table)}:
+            condition = sa.text(where)
+            op.create_index(name, table, columns, unique=True, postgresql_where=condition,
+                            mssql_where=condition, sqlite_where=condition)
+    for name, table, columns, include in INDEXES:
+        if name not in {i['name'] for i in inspector.get_indexes(table)}:
+            kwargs = {'postgresql_include': include, 'mssql_include': include} if include else {}
+            op.create_index(name, table, columns, **kwargs)
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    for name, table, _, _ in reversed(UNIQUE_INDEXES):
+        op.drop_index(name, table_name=table)
+    for name, table, _ in reversed(UNIQUE_CONSTRAINTS):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_constraint(name, type_='unique')
@@ -0,0 +1,35 @@
+"""id allocation blocks
+
+Counter rows id_allocator.py reserves id blocks from on databases without
+sequences. PostgreSQL and SQL Server use a sequence created on first use.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table('id_blocks'):
+        op.create_table(
+            'id_blocks',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('next_value', sa.BigInteger(), nullable=False),
+            sa.PrimaryKeyConstraint('name'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('id_blocks')
@@ -0,0 +1,35 @@
+"""sync watermarks
+
+Highest OLTP id each incremental sync has moved into the warehouse.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table('sync_watermarks'):
+        op.create_table(
+            'sync_watermarks',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('last_id', sa.BigInteger(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('name'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('sync_watermarks')
@@ -0,0 +1,82 @@
+import os
+
+from sqlalchemy import select, func, text
+from sqlalchemy.orm import Session
+
+# Filtered counts are exact up to this many rows, estimated beyond it
+COUNT_EXACT_LIMIT = int(os.getenv("COUNT_EXACT_LIMIT", "10000"))
+# Rows of the newest id range a filtered estimate is extrapolated from
+COUNT_SAMPLE_ROWS = int(os.getenv("COUNT_SAMPLE_ROWS", "20000"))
+# Unfiltered counts below this come from COUNT(*) even where statistics exist
+COUNT_STATS_MIN = int(os.getenv("COUNT_STATS_MIN", "100000"))
+
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_APPROXIMATE_HEADER = "X-Total-Approximate"
+
+
+def result(count: int, approximate: bool = False):
+    return {"count": int(count), "approximate": approximate}
+
+
+def headers(counted):
+    return {
+        TOTAL_COUNT_HEADER: str(counted["count"]),
+        TOTAL_APPROXIMATE_HEADER: "true" if counted["approximate"] else "false",
+    }
+
+
+def bounded_count(db: Session, query, limit: int):
+    """Exact COUNT of query, reading at most limit + 1 rows."""
+    sub = query.limit(limit + 1).subquery()
+    return db.execute(select(func.count()).select_from(sub)).scalar()
+
+
+def table_estimate(db: Session, table_name: str):
+    """Row count from catalog statistics, or None where the dialect has none."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        estimate = db.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"), {"name": table_name}
+        ).scalar()
+    elif dialect == "mssql":
+        estimate = db.execute(
+            text("SELECT SUM(row_count) FROM sys.dm_db_partition_stats "
+                 "WHERE object_id = OBJECT_ID(:name) AND index_id IN (0, 1)"), {"name": table_name}
+        ).scalar()
+    else:
+        return None
+    # reltuples is -1 for tables that were never analyzed
+    return int(estimate) if estimate is not None and estimate >= 0 else None
+
+
+def table_count(db: Session, model, exact: bool = False):
+    """Unfiltered row count: statistics for big tables, COUNT(*) otherwise."""
+    if not exact:
+        estimate = table_estimate(db, model.__tablename__)
+        if estimate is not None and estimate >= COUNT_STATS_MIN:
+            return result(estimate, approximate=True)
+    return result(db.query(func.count(model.id)).scalar())
+
+
+def filtered_count(db: Session, query, id_column, total: int, exact: bool = False,
+                   limit: int = None, sample_rows: int = None):
+    """Count of a filtered id query: exact up to limit, then estimated.
+
+    The estimate is the match rate over the newest sample_rows ids scaled
+    to the total row count.
+    """
+    limit = COUNT_EXACT_LIMIT if limit is None else limit
+    sample_rows = sample_rows or COUNT_SAMPLE_ROWS
+    if exact:
+        return result(db.execute(select(func.count()).select_from(query.subquery())).scalar())
+    counted = bounded_count(db, query, limit)
+    if counted <= limit:
+        return result(counted)
+    cutoff = db.execute(
+        select(id_column).order_by(id_column.desc()).offset(sample_rows).limit(1)
+    ).scalar()
+    if cutoff is None:
+        # The whole table fits in the sample, so just count it
+        return result(db.execute(select(func.count()).select_from(query.subquery())).scalar())
+    sampled = bounded_count(db, query.filter(id_column > cutoff), sample_rows)
+    return result(max(counted, round(sampled / sample_rows * total)), approximate=True)
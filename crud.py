@@ -1,47 +1,98 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from models import FactSales, DimManager, DimProduct, DimRegion, DimSupplier, DimCategory, DimDate
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from models import FactSales, DimManager, DimProduct, DimRegion, AggSalesMonthly, SalesTotals
 import schemas
+import dim_cache
+import rollups
+import result_cache
+import cube
+import pagination
+import counts
+import id_allocator
+import search as search_index
 
 def get_sale(db: Session, sale_id: int):
     return db.query(FactSales).filter(FactSales.id == sale_id).first()
 
-def get_sales(db: Session, skip: int = 0, limit: int = 100, search: str = None):
-    q = db.query(FactSales)
+def _ilike_sales(query, search: str):
+    query = query.join(DimProduct, FactSales.product_id == DimProduct.id)\
+         .join(DimManager, FactSales.manager_id == DimManager.id)\
+         .join(DimRegion, FactSales.region_id == DimRegion.id)
+    like = f"%{search}%"
+    return query.filter(
+        (DimProduct.name.ilike(like)) |
+        (DimManager.name.ilike(like)) |
+        (DimRegion.region_name.ilike(like)) |
+        (DimRegion.city.ilike(like))
+    )
+
+def _filter_sales(db: Session, query, search: str = None):
+    if not search:
+        return query
+    indexed = search_index.search.filter(db, query, search)
+    return indexed if indexed is not None else _ilike_sales(query, search)
+
+def sale_options(names: bool = False):
+    """Loader options that fetch what the Sale schemas read in the page query itself.
+
+    Every relationship is many-to-one on a NOT NULL key, so inner joins
+    add columns to the same rows instead of one SELECT per sale.
+    """
+    options = [joinedload(FactSales.dim_date, innerjoin=True)]
+    if names:
+        options += [
+            joinedload(FactSales.product, innerjoin=True).joinedload(DimProduct.category),
+            joinedload(FactSales.manager, innerjoin=True),
+            joinedload(FactSales.supplier, innerjoin=True),
+            joinedload(FactSales.region, innerjoin=True),
+        ]
+    return options
+
+def get_sales(db: Session, skip: int = 0, limit: int = 100, search: str = None, names: bool = False):
+    query = db.query(FactSales).options(*sale_options(names))
+    return _filter_sales(db, query, search).order_by(FactSales.id).offset(skip).limit(limit).all()
+
+def get_sales_page(db: Session, limit: int = 100, search: str = None,
+                   after: str = None, before: str = None, skip: int = 0, names: bool = False):
+    """A page of sales by id; after/before are cursors from a previous page."""
+    query = _filter_sales(db, db.query(FactSales).options(*sale_options(names)), search)
+    return pagination.seek(query, FactSales.id, limit, after=after, before=before, skip=skip)
+
+async def get_sales_page_async(db: AsyncSession, limit: int = 100, search: str = None,
+                               after: str = None, before: str = None, skip: int = 0, names: bool = False):
+    """get_sales_page on an async session."""
+    stmt = select(FactSales).options(*sale_options(names))
     if search:
-        q = q.join(DimProduct, FactSales.product_id == DimProduct.id)\
-             .join(DimManager, FactSales.manager_id == DimManager.id)\
-             .join(DimRegion, FactSales.region_id == DimRegion.id)
-        like = f"%{search}%"
-        q = q.filter(
-            (DimProduct.name.ilike(like)) |
-            (DimManager.name.ilike(like)) |
-            (DimRegion.region_name.ilike(like)) |
-            (DimRegion.city.ilike(like))
-        )
-    return q.order_by(FactSales.id).offset(skip).limit(limit).all()
+        matches = await db.run_sync(search_index.search.match, search)
+        condition = search_index.search.condition(matches)
+        stmt = stmt.where(condition) if condition is not None else _ilike_sales(stmt, search)
+    stmt = pagination.seek_query(stmt, FactSales.id, limit, after=after, before=before, skip=skip)
+    rows = (await db.execute(stmt)).scalars().all()
+    return pagination.seek_page(rows, FactSales.id, limit, after=after, before=before, skip=skip)
 
 def get_sales_count(db: Session, search: str = None):
-    q = db.query(func.count(FactSales.id))
-    if search:
-        q = q.join(DimProduct, FactSales.product_id == DimProduct.id)\
-             .join(DimManager, FactSales.manager_id == DimManager.id)\
-             .join(DimRegion, FactSales.region_id == DimRegion.id)
-        like = f"%{search}%"
-        q = q.filter(
-            (DimProduct.name.ilike(like)) |
-            (DimManager.name.ilike(like)) |
-            (DimRegion.region_name.ilike(like)) |
-            (DimRegion.city.ilike(like))
-        )
-    return q.scalar()
+    return _filter_sales(db, db.query(func.count(FactSales.id)), search).scalar()
+
+def count_sales(db: Session, search: str = None, exact: bool = False):
+    """{"count", "approximate"}; the total comes from the running-totals row."""
+    total = db.query(SalesTotals.sale_count).filter(SalesTotals.id == rollups.TOTALS_ID).scalar()
+    if total is None:
+        total = db.query(func.count(FactSales.id)).scalar()
+    if not search:
+        return counts.result(total)
+    query = _filter_sales(db, db.query(FactSales.id), search)
+    return counts.filtered_count(db, query, FactSales.id, total, exact=exact)
+
+async def count_sales_async(db: AsyncSession, search: str = None, exact: bool = False):
+    # The sync code runs in a greenlet on the event loop; no threadpool thread is taken
+    return await db.run_sync(count_sales, search, exact)
 
 def create_sale(db: Session, sale: schemas.SaleCreate):
     
     revenue = (sale.quantity * sale.unit_price) - sale.discount
     
-    max_id = db.query(func.max(FactSales.sale_id)).scalar() or 0
-    new_sale_id = max_id + 1
+    new_sale_id = id_allocator.sale_ids.next_id(db)
 
     db_sale = FactSales(
         sale_id=new_sale_id,
@@ -59,7 +110,10 @@ def create_sale(db: Session, sale: schemas.SaleCreate):
     )
     
     db.add(db_sale)
+    db.flush()
+    rollups.apply_facts(db, rollups.sales_frame([db_sale]))
     db.commit()
+    result_cache.invalidate()
     db.refresh(db_sale)
     return db_sale
 
@@ -67,6 +121,7 @@ def update_sale(db: Session, sale_id: int, sale: schemas.SaleCreate):
     db_sale = db.query(FactSales).filter(FactSales.id == sale_id).first()
     if not db_sale:
         return None
+    old = rollups.sales_frame([db_sale])
     
     # Update fields
     db_sale.product_id = sale.product_id
@@ -82,54 +137,60 @@ def update_sale(db: Session, sale_id: int, sale: schemas.SaleCreate):
     # Recalculate revenue
     db_sale.revenue = (sale.quantity * sale.unit_price) - sale.discount
 
+    rollups.apply_facts(db, old, sign=-1)
+    rollups.apply_facts(db, rollups.sales_frame([db_sale]))
     db.commit()
+    result_cache.invalidate()
+    cube.cube.invalidate()
     db.refresh(db_sale)
     return db_sale
 
 def delete_sale(db: Session, sale_id: int):
     db_sale = db.query(FactSales).filter(FactSales.id == sale_id).first()
     if db_sale:
+        rollups.apply_facts(db, rollups.sales_frame([db_sale]), sign=-1)
         db.delete(db_sale)
         db.commit()
+        result_cache.invalidate()
+        cube.cube.invalidate()
     return db_sale
 
 def get_dims(db: Session, dim_name: str):
-    if dim_name == "manager":
-        return db.query(DimManager).all()
-    if dim_name == "category":
-        return db.query(DimCategory).all()
-    if dim_name == "product":
-        return db.query(DimProduct).all()
-    if dim_name == "region":
-        return db.query(DimRegion).all()
-    if dim_name == "supplier":
-        return db.query(DimSupplier).all()
-    return []
+    if dim_name not in ("manager", "category", "product", "region", "supplier"):
+        return []
+    return dim_cache.cache.rows(db, dim_name)
 
+async def get_dims_async(db: AsyncSession, dim_name: str):
+    return await db.run_sync(get_dims, dim_name)
 
-def get_rankings(db: Session, entity_type: str, limit: int = 5):
+
+def rankings_statement(entity_type: str, limit: int = 5):
+    """Top limit members by revenue, or None for an unknown entity type."""
+    # Managers and regions come from the monthly rollup, products from facts
     if entity_type == "manager":
-        model = DimManager
-        col = FactSales.manager_id
-        name_col = DimManager.name
+        source, fk, revenue = AggSalesMonthly, AggSalesMonthly.manager_id, AggSalesMonthly.revenue
+        model, name_col = DimManager, DimManager.name
     elif entity_type == "product":
-        model = DimProduct
-        col = FactSales.product_id
-        name_col = DimProduct.name
+        source, fk, revenue = FactSales, FactSales.product_id, FactSales.revenue
+        model, name_col = DimProduct, DimProduct.name
     elif entity_type == "region":
-        model = DimRegion
-        col = FactSales.region_id
-        name_col = DimRegion.region_name 
+        source, fk, revenue = AggSalesMonthly, AggSalesMonthly.region_id, AggSalesMonthly.revenue
+        model, name_col = DimRegion, DimRegion.region_name
     else:
-        return []
+        return None
 
-    results = db.query(
-        name_col.label("name"),
-        func.sum(FactSales.revenue).label("total_revenue")
-    ).join(model, col == model.id)\
-    .group_by(name_col)\
-    .order_by(desc("total_revenue"))\
-    .limit(limit)\
-    .all()
-    
-    return [{"rank": i+1, "name": r[0], "revenue": float(r[1])} for i, r in enumerate(results)]
+    # Grouped by name so same-named members merge; only limit rows come back
+    total = func.sum(revenue).label("total_revenue")
+    return select(name_col, total).select_from(source).join(model, fk == model.id) \
+        .group_by(name_col).order_by(total.desc(), name_col).limit(limit)
+
+def _ranked(rows):
+    return [{"rank": i+1, "name": name, "revenue": float(revenue or 0)} for i, (name, revenue) in enumerate(rows)]
+
+def get_rankings(db: Session, entity_type: str, limit: int = 5):
+    stmt = rankings_statement(entity_type, limit)
+    return _ranked(db.execute(stmt).all()) if stmt is not None else []
+
+async def get_rankings_async(db: AsyncSession, entity_type: str, limit: int = 5):
+    stmt = rankings_statement(entity_type, limit)
+    return _ranked((await db.execute(stmt)).all()) if stmt is not None else []
@@ -0,0 +1,290 @@
+import os
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+import dim_cache
+import result_cache
+from models import FactSales
+
+# Default engine for /reports/aggregate: "sql" or "cube"
+REPORT_ENGINE = os.getenv("REPORT_ENGINE", "sql")
+# Rows fetched per round trip while loading fact_sales into the cube
+CUBE_LOAD_BATCH = int(os.getenv("CUBE_LOAD_BATCH", "100000"))
+# Seconds after which the cube is reloaded in full, catching facts other
+# processes updated in place; 0 never reloads on age alone
+CUBE_MAX_AGE = float(os.getenv("CUBE_MAX_AGE", "300"))
+
+ID_COLUMNS = ["date_id", "product_id", "manager_id", "supplier_id", "region_id"]
+# Money measures are held as integer cents so sums are exact
+CENT_COLUMNS = ["revenue", "discount", "unit_price"]
+
+# Report dimension -> (fact id column, dimension, attribute of the dimension row)
+ATTRIBUTES = {
+    "region": ("region_id", "region", "region_name"),
+    "manager": ("manager_id", "manager", "name"),
+    "supplier": ("supplier_id", "supplier", "name"),
+    "product": ("product_id", "product", "name"),
+    "category": ("product_id", "product", "category"),
+    "year": ("date_id", "date", "year"),
+    "quarter": ("date_id", "date", "quarter"),
+    "month": ("date_id", "date", "month_name"),
+}
+
+
+def supports(filters):
+    """Whether the cube can evaluate these filters; dates must be ISO dates."""
+    for name in ("date_from", "date_to"):
+        if name in filters:
+            try:
+                date.fromisoformat(str(filters[name])[:10])
+            except ValueError:
+                return False
+    return True
+
+
+class Encoding:
+    """Dictionary encoding of one report attribute: a code per fact row."""
+
+    def __init__(self, codes: np.ndarray, values):
+        self.codes = codes
+        self.values = values
+        self.index = {v: i for i, v in enumerate(values)}
+
+
+class Snapshot:
+    """The cube's columns as of one query, with the dimension entries it reads."""
+
+    def __init__(self, columns, encodings):
+        self.columns = columns
+        self.encodings = encodings
+        # dimension name -> dim_cache.DimensionEntry
+        self.entries = {}
+
+
+def _empty_columns():
+    return {c: np.empty(0, dtype=np.int64) for c in ["id"] + ID_COLUMNS + ["quantity"] + CENT_COLUMNS}
+
+
+def _extend(columns, parts):
+    """A new column dict with the fetched parts appended; columns is left as it was."""
+    return {c: np.concatenate([columns[c]] + parts[c]) if parts[c] else columns[c] for c in columns}
+
+
+class SalesCube:
+    """fact_sales held in NumPy arrays for in-memory group-by reports.
+
+    Dimension attributes are dictionary-encoded from the dimension cache and
+    groups are summed with np.bincount over the code combinations present.
+    New facts are appended incrementally as they show up in fact_sales;
+    deletes and updates force a full reload.
+
+    Loads and queries run without the lock, which is only taken to read or
+    swap the current columns: those are replaced on refresh, never changed
+    in place, so a query keeps a consistent snapshot while another loads.
+    """
+
+    def __init__(self, max_age: float = CUBE_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.columns = _empty_columns()
+        self.generation = None
+        self.loaded_at = 0.0
+        self.stale = True
+        # (dimension, dimension cache version) -> Encoding of the current columns
+        self._encodings = {}
+
+    @property
+    def rows(self):
+        return len(self.columns["id"])
+
+    @property
+    def max_id(self):
+        return int(self.columns["id"][-1]) if self.rows else 0
+
+    def invalidate(self):
+        """Force a full reload before the next query (after updates or deletes)."""
+        self.stale = True
+
+    def _fetch(self, db: Session, after_id: int):
+        cols = [FactSales.id] + [getattr(FactSales, c) for c in ID_COLUMNS + ["quantity"] + CENT_COLUMNS]
+        stmt = select(*cols).where(FactSales.id > after_id).order_by(FactSales.id)
+        result = db.execute(stmt.execution_options(yield_per=CUBE_LOAD_BATCH))
+        names = ["id"] + ID_COLUMNS + ["quantity"]
+        parts = {c: [] for c in self.columns}
+        for batch in result.partitions():
+            # NULL (only discount is nullable) sums as 0, like SQL SUM
+            block = np.nan_to_num(np.array([tuple(row) for row in batch], dtype=np.float64))
+            for i, c in enumerate(names):
+                parts[c].append(block[:, i].astype(np.int64))
+            for i, c in enumerate(CENT_COLUMNS, start=len(names)):
+                parts[c].append(np.rint(block[:, i] * 100).astype(np.int64))
+        return parts
+
+    def refresh(self, db: Session):
+        """Bring the cube up to date with fact_sales.
+
+        The row count and highest id are compared on every call, so facts
+        other processes add or delete are seen as well; their updates in
+        place are picked up by the full reload every max_age seconds.
+        Concurrent refreshes may each read the new facts; the last to
+        finish is kept, labelled with the generation it read.
+        """
+        generation = result_cache.cache.backend.generation()
+        count, max_id = db.execute(select(func.count(FactSales.id), func.max(FactSales.id))).one()
+        max_id = max_id or 0
+        with self._lock:
+            expired = self.max_age > 0 and time.monotonic() - self.loaded_at >= self.max_age
+            full = self.stale or expired
+            if not full and generation == self.generation and (count, max_id) == (self.rows, self.max_id):
+                return
+            columns = _empty_columns() if full else self.columns
+        known = int(columns["id"][-1]) if len(columns["id"]) else 0
+        if max_id < known:
+            columns, known, full = _empty_columns(), 0, True
+        if max_id > known:
+            columns = _extend(columns, self._fetch(db, known))
+        if len(columns["id"]) != count:
+            # Rows vanished or changed below max_id: start over
+            columns, full = _extend(_empty_columns(), self._fetch(db, 0)), True
+        with self._lock:
+            if columns is not self.columns:
+                self.columns = columns
+                self._encodings = {}
+            if full:
+                self.loaded_at = time.monotonic()
+            self.generation = generation
+            self.stale = False
+
+    @staticmethod
+    def _remember(encodings, key, value):
+        """Cache value under key, dropping what was encoded for older dimension versions."""
+        for old in list(encodings):
+            if old[1] != key[1]:
+                encodings.pop(old, None)
+        encodings[key] = value
+        return value
+
+    def load(self, db: Session, plan) -> Snapshot:
+        """Everything execute() reads from the database for plan: the facts and dimension rows."""
+        self.refresh(db)
+        with self._lock:
+            snapshot = Snapshot(self.columns, self._encodings)
+        names = list(plan.dimensions) + [name for name in plan.filters if name not in ("date_from", "date_to")]
+        for dimension in names:
+            id_col, dim, attribute = ATTRIBUTES[dimension]
+            entry = dim_cache.cache.entry(db, dim)
+            ids = snapshot.columns[id_col]
+            if (dimension, entry.version) not in snapshot.encodings and len(ids) \
+                    and ids.max() >= max(entry.by_id, default=0) + 1:
+                # Facts reference members added since the cache was loaded
+                dim_cache.cache.invalidate()
+                entry = dim_cache.cache.entry(db, dim)
+            snapshot.entries[dim] = entry
+            if attribute == "category":
+                snapshot.entries["category"] = dim_cache.cache.entry(db, "category")
+        if "date_from" in plan.filters or "date_to" in plan.filters:
+            snapshot.entries["date"] = dim_cache.cache.entry(db, "date")
+        return snapshot
+
+    def _encoding(self, snapshot: Snapshot, dimension: str) -> Encoding:
+        id_col, dim, attribute = ATTRIBUTES[dimension]
+        entry = snapshot.entries[dim]
+        cached = snapshot.encodings.get((dimension, entry.version))
+        if cached is not None:
+            return cached
+
+        ids = snapshot.columns[id_col]
+        rows = entry.rows
+        if attribute == "category":
+            categories = {c["id"]: c["name"] for c in snapshot.entries["category"].rows}
+            attr = {r["id"]: categories.get(r["category_id"]) for r in rows}
+        else:
+            attr = {r["id"]: r[attribute] for r in rows}
+
+        values = sorted({v for v in attr.values() if v is not None}, key=lambda v: (str(type(v)), v))
+        index = {v: i for i, v in enumerate(values)}
+        lut = np.full(max(attr, default=0) + 1, -1, dtype=np.int64)
+        for dim_id, value in attr.items():
+            if value is not None:
+                lut[dim_id] = index[value]
+        codes = lut[ids] if len(ids) else np.empty(0, dtype=np.int64)
+        return self._remember(snapshot.encodings, (dimension, entry.version), Encoding(codes, values))
+
+    def _date_ordinals(self, snapshot: Snapshot):
+        entry = snapshot.entries["date"]
+        cached = snapshot.encodings.get(("date_ordinal", entry.version))
+        if cached is not None:
+            return cached
+        lut = np.full(max(entry.by_id, default=0) + 1, -1, dtype=np.int64)
+        for r in entry.rows:
+            lut[r["id"]] = r["date"].toordinal()
+        ids = snapshot.columns["date_id"]
+        ordinals = lut[ids] if len(ids) else np.empty(0, dtype=np.int64)
+        return self._remember(snapshot.encodings, ("date_ordinal", entry.version), ordinals)
+
+    def _mask(self, snapshot: Snapshot, filters):
+        rows = len(snapshot.columns["id"])
+        mask = np.ones(rows, dtype=bool)
+        for name, value in filters.items():
+            if name in ("date_from", "date_to"):
+                ordinal = date.fromisoformat(str(value)[:10]).toordinal()
+                ordinals = self._date_ordinals(snapshot)
+                mask &= (ordinals >= ordinal) if name == "date_from" else (ordinals <= ordinal) & (ordinals >= 0)
+            else:
+                encoding = self._encoding(snapshot, name)
+                code = encoding.index.get(value)
+                if code is None:
+                    return np.zeros(rows, dtype=bool)
+                mask &= encoding.codes == code
+        return mask
+
+    def execute(self, db: Session, plan):
+        """Rows for a reports.AggregatePlan: d1, d2, ... plus the plan's measures."""
+        return self.compute(self.load(db, plan), plan)
+
+    def compute(self, snapshot: Snapshot, plan):
+        """execute() on what load() read: CPU only, so it may run on any thread."""
+        columns = snapshot.columns
+        encodings = [self._encoding(snapshot, d) for d in plan.dimensions]
+        mask = self._mask(snapshot, plan.filters)
+        for encoding in encodings:
+            mask &= encoding.codes >= 0
+
+        # Number only the code combinations that occur, so memory and time
+        # follow the matching rows, not the product of the cardinalities
+        keys = np.stack([encoding.codes[mask] for encoding in encodings], axis=1)
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        counts = np.bincount(inverse, minlength=len(groups))
+        sums = {}
+        for measure in plan.measures:
+            if measure == "count":
+                continue
+            column = "quantity" if measure == "quantity" else measure
+            sums[measure] = np.bincount(inverse, weights=columns[column][mask], minlength=len(groups))
+
+        results = []
+        for group, codes in enumerate(groups):
+            row = {f"d{i + 1}": encodings[i].values[code] for i, code in enumerate(codes)}
+            for measure in plan.measures:
+                if measure == "count":
+                    row[measure] = int(counts[group])
+                elif measure == "quantity":
+                    row[measure] = int(sums[measure][group])
+                else:
+                    row[measure] = Decimal(int(sums[measure][group])).scaleb(-2)
+            results.append(row)
+        return results
+
+    def stats(self):
+        return {"rows": self.rows, "max_id": self.max_id, "generation": self.generation, "stale": self.stale}
+
+
+cube = SalesCube()
@@ -0,0 +1,100 @@
+from sqlalchemy import select, func, case, and_, or_, true, literal
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import reports
+import rollups
+from models import SalesTotals, FactSales, AggSalesMonthly
+
+# Source table -> dashboard measure -> per-row value that is summed
+COLUMNS = {
+    reports.FACTS.name: {"revenue": FactSales.revenue, "quantity": FactSales.quantity, "count": literal(1)},
+    reports.ROLLUP.name: {"revenue": AggSalesMonthly.revenue, "quantity": AggSalesMonthly.quantity,
+                          "count": AggSalesMonthly.sale_count},
+}
+KEYS = ("total_revenue", "total_quantity", "count_sales", "avg_check")
+
+
+def _metrics(revenue, quantity, count):
+    revenue, quantity, count = float(revenue or 0), int(quantity or 0), int(count or 0)
+    return {
+        "total_revenue": revenue,
+        "total_quantity": quantity,
+        "count_sales": count,
+        "avg_check": revenue / count if count > 0 else 0,
+    }
+
+
+def running_totals(db: Session):
+    """Metrics over all sales from the single sales_totals row."""
+    row = db.get(SalesTotals, rollups.TOTALS_ID)
+    if row is None:
+        agg = AggSalesMonthly
+        row = db.query(func.sum(agg.revenue), func.sum(agg.quantity), func.sum(agg.sale_count)).one()
+        return _metrics(*row)
+    return _metrics(row.revenue, row.quantity, row.sale_count)
+
+
+def _period_filters(start, end):
+    return {k: v for k, v in (("date_from", start), ("date_to", end)) if v}
+
+
+def _choose_source(filters, periods):
+    for source in reports.SOURCES:
+        if source.supports([], filters) and all(source.supports([], _period_filters(s, e)) for s, e in periods):
+            return source
+    return reports.FACTS
+
+
+def _period_condition(source, start, end):
+    conditions = [source.filters[name][0](value) for name, value in _period_filters(start, end).items()]
+    return and_(true(), *conditions)
+
+
+def dashboard_metrics(db: Session, date_from: str = None, date_to: str = None,
+                      compare_from: str = None, compare_to: str = None, **filters):
+    """Dashboard totals for a date range and dimension filters in one query.
+
+    With compare_from/compare_to the same metrics for the comparison period
+    come back under "previous", computed in the same pass with CASE, plus
+    the relative "change". Without any filter the running totals row is read.
+    """
+    filters = {k: v for k, v in filters.items() if v}
+    periods = {"current": (date_from, date_to)}
+    if compare_from or compare_to:
+        periods["previous"] = (compare_from, compare_to)
+    if not filters and not date_from and not date_to and len(periods) == 1:
+        return running_totals(db)
+
+    source = _choose_source(filters, periods.values())
+    needed = dict(filters)
+    for start, end in periods.values():
+        needed.update(_period_filters(start, end))
+    joins = reports.AggregatePlan([], [], needed, source).joins
+
+    columns = COLUMNS[source.name]
+    conditions = {name: _period_condition(source, *dates) for name, dates in periods.items()}
+    stmt = select(*[
+        func.sum(case((condition, columns[m]), else_=0)).label(f"{name}_{m}")
+        for name, condition in conditions.items() for m in ("revenue", "quantity", "count")
+    ]).select_from(source.table)
+    for table in joins:
+        model, onclause = source.joins[table]
+        stmt = stmt.join(model, onclause)
+    for name, value in filters.items():
+        stmt = stmt.where(source.filters[name][0](value))
+    stmt = stmt.where(or_(*conditions.values()))
+    row = db.execute(stmt).one()._mapping
+
+    result = _metrics(row["current_revenue"], row["current_quantity"], row["current_count"])
+    if "previous" in periods:
+        previous = _metrics(row["previous_revenue"], row["previous_quantity"], row["previous_count"])
+        result["previous"] = previous
+        result["change"] = {
+            k: (result[k] - previous[k]) / previous[k] if previous[k] else None for k in KEYS
+        }
+    return result
+
+
+async def dashboard_metrics_async(db: AsyncSession, **params):
+    return await db.run_sync(dashboard_metrics, **params)
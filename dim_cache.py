@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import DimRegion, DimManager, DimSupplier, DimCategory, DimProduct, DimDate
+
+# Seconds a cached dimension is trusted before it is reloaded anyway, so
+# members added by other processes show up without an explicit invalidation
+DIM_CACHE_TTL = float(os.getenv("DIM_CACHE_TTL", "300"))
+
+# Dimension name -> (model, natural key columns)
+DIMENSIONS = {
+    "region": (DimRegion, ("region_name", "city")),
+    "manager": (DimManager, ("name",)),
+    "supplier": (DimSupplier, ("name",)),
+    "category": (DimCategory, ("name",)),
+    "product": (DimProduct, ("business_id",)),
+    "date": (DimDate, ("date",)),
+}
+
+
+class DimensionEntry:
+    def __init__(self, dim: str, rows, version: int):
+        _, key_cols = DIMENSIONS[dim]
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.rows = rows
+        self.by_id = {row["id"]: row for row in rows}
+        if len(key_cols) == 1:
+            self.by_key = {row[key_cols[0]]: row["id"] for row in rows}
+        else:
+            self.by_key = {tuple(row[c] for c in key_cols): row["id"] for row in rows}
+
+
+class DimensionCache:
+    """Process-wide name -> id and id -> row maps for every dimension table.
+
+    Entries are loaded lazily and reused until a dimension write calls
+    invalidate(), which bumps the version counter, or until they are older
+    than ttl seconds.
+    """
+
+    def __init__(self, ttl: float = DIM_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, entry: DimensionEntry):
+        return (entry is not None and entry.version == self.version
+                and time.monotonic() - entry.loaded_at < self.ttl)
+
+    def _load(self, db: Session, dim: str):
+        model, _ = DIMENSIONS[dim]
+        rows = [dict(r) for r in db.execute(select(model.__table__)).mappings()]
+        if dim == "region":
+            for row in rows:
+                row["name"] = f"{row['region_name']} - {row['city']}"
+        return rows
+
+    def entry(self, db: Session, dim: str) -> DimensionEntry:
+        return self.lookup(db, dim)[0]
+
+    def lookup(self, db: Session, dim: str):
+        """(entry, loaded): loaded is True when this call read the table.
+
+        The table is read without holding the lock, so concurrent loads of
+        the same dimension may both query; the lock only guards the swap.
+        """
+        entry = self._entries.get(dim)
+        if self._fresh(entry):
+            self.hits += 1
+            return entry, False
+        version = self.version
+        entry = DimensionEntry(dim, self._load(db, dim), version)
+        with self._lock:
+            self.misses += 1
+            # Not kept if invalidate() ran meanwhile; the next lookup reloads
+            if version == self.version:
+                self._entries[dim] = entry
+        return entry, True
+
+    def key_map(self, db: Session, dim: str):
+        """Natural key (tuple for multi-column keys) -> surrogate id."""
+        return self.entry(db, dim).by_key
+
+    def rows(self, db: Session, dim: str):
+        """Every row of the dimension as a dict; regions carry a display name."""
+        return self.entry(db, dim).rows
+
+    def row(self, db: Session, dim: str, dim_id: int):
+        return self.entry(db, dim).by_id.get(dim_id)
+
+    def names(self, db: Session, dim: str, column: str = "name"):
+        """Surrogate id -> value of one column, e.g. region id -> region_name."""
+        return {dim_id: row[column] for dim_id, row in self.entry(db, dim).by_id.items()}
+
+    def invalidate(self):
+        """Called after dimension writes; every entry is reloaded on next use."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "ttl": self.ttl,
+            "dimensions": {dim: len(entry.rows) for dim, entry in self._entries.items()},
+        }
+
+
+cache = DimensionCache()
@@ -1,132 +1,340 @@
 import pandas as pd
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from database import SessionLocal, engine
-import models
+from sqlalchemy import insert, select, UniqueConstraint
+from database import EtlSessionLocal
+import fact_writer
+import dim_cache
+import rollups
+import result_cache
+import id_allocator
 import sys
 import os
+import time
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from datetime import datetime
+# Rows per chunk when streaming CSV input; 0 reads the whole file at once
+ETL_CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE", "50000"))
 
-def process_data(df: pd.DataFrame, db: Session):
+def _records(frame: pd.DataFrame):
+    """Frame rows as plain dicts with NaN replaced by None."""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+def _insert_missing(db: Session, model, rows, conflict_cols=None):
+    """Insert dimension rows in a single batch.
+
+    Where the dialect supports it and the natural key is unique, the insert
+    skips rows another loader added in the meantime (ON CONFLICT DO NOTHING).
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if conflict_cols and dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(model.__table__).on_conflict_do_nothing(
+            index_elements=conflict_cols, index_where=_unique_where(model, conflict_cols, dialect))
+    elif conflict_cols and dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(model.__table__).on_conflict_do_nothing(
+            index_elements=conflict_cols, index_where=_unique_where(model, conflict_cols, dialect))
+    else:
+        stmt = insert(model.__table__)
+    db.execute(stmt, rows)
+
+def _key_map(db: Session, model, key_cols):
+    """Natural key -> surrogate id for every member of a dimension, in one query."""
+    cols = [getattr(model, c) for c in key_cols]
+    rows = db.execute(select(model.id, *cols)).all()
+    if len(key_cols) == 1:
+        return {r[1]: r[0] for r in rows}
+    return {tuple(r[1:]): r[0] for r in rows}
+
+def _missing_members(members: pd.DataFrame, key_cols, key_map):
+    if len(key_cols) == 1:
+        keys = members[key_cols[0]].tolist()
+    else:
+        keys = list(members[key_cols].itertuples(index=False, name=None))
+    return members[[k not in key_map for k in keys]]
+
+def _resolve_dimension(db: Session, dim: str, members: pd.DataFrame):
+    """Make sure every member exists and return the natural key -> id map.
+
+    Known members are answered from the shared dimension cache. Otherwise
+    it costs one SELECT, at most one batched INSERT and one more SELECT,
+    however many members are passed in. Returns (key_map, inserted).
+    """
+    model, key_cols = dim_cache.DIMENSIONS[dim]
+    key_cols = list(key_cols)
+    members = members.drop_duplicates(subset=key_cols)
+    entry, loaded = dim_cache.cache.lookup(db, dim)
+    key_map = entry.by_key
+    missing = _missing_members(members, key_cols, key_map)
+    if not len(missing):
+        return key_map, False
+
+    if not loaded:
+        # The cache may predate members another process added; ask the table
+        key_map = _key_map(db, model, key_cols)
+        missing = _missing_members(members, key_cols, key_map)
+    if not len(missing):
+        return key_map, False
+    _insert_missing(db, model, _records(missing), _unique_cols(model, key_cols))
+    return _key_map(db, model, key_cols), True
+
+def _unique_cols(model, key_cols):
+    """key_cols if the table enforces uniqueness on exactly those columns.
+
+    A filtered unique index counts: NULL keys never conflict anyway.
+    """
+    table = model.__table__
+    wanted = set(key_cols)
+    if len(key_cols) == 1 and table.c[key_cols[0]].unique:
+        return list(key_cols)
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and {c.name for c in constraint.columns} == wanted:
+            return list(key_cols)
+    for index in table.indexes:
+        if index.unique and {c.name for c in index.columns} == wanted:
+            return list(key_cols)
+    return None
+
+def _unique_where(model, key_cols, dialect):
+    """The filter of a partial unique index on key_cols, which ON CONFLICT must repeat."""
+    wanted = set(key_cols)
+    for index in model.__table__.indexes:
+        if index.unique and {c.name for c in index.columns} == wanted:
+            return index.dialect_options[dialect]['where']
+    return None
+
+def add_date_column(df: pd.DataFrame):
+    """Derive the calendar date of each sale from sale_datetime, in place."""
+    # Convert sale_datetime to date
+    if 'sale_datetime' in df.columns:
+        df['date'] = pd.to_datetime(df['sale_datetime']).dt.date
+    return df
+
+def dimension_members(df: pd.DataFrame):
+    """Distinct members of each dimension referenced by df, in first-seen order."""
+    add_date_column(df)
+    members = {}
+    if 'region_name' in df.columns and 'city' in df.columns:
+        members['region'] = df[['region_name', 'city']].drop_duplicates()
+    if 'manager' in df.columns:
+        members['manager'] = df[['manager']].drop_duplicates()
+    if 'supplier_name' in df.columns:
+        members['supplier'] = df[['supplier_name', 'supplier_country']].drop_duplicates(subset=['supplier_name'])
+    if 'category' in df.columns:
+        members['category'] = df[['category']].drop_duplicates()
+    if 'product_id' in df.columns:
+        members['product'] = df[['product_id', 'product_name', 'brand', 'category']].drop_duplicates(subset=['product_id'])
+    if 'date' in df.columns:
+        members['date'] = df[['date']].drop_duplicates()
+    return members
+
+def merge_members(parts):
+    """Combine dimension_members results from several slices of one input."""
+    merged = {}
+    for part in parts:
+        for dim, frame in part.items():
+            merged.setdefault(dim, []).append(frame)
+    return {dim: pd.concat(frames, ignore_index=True) for dim, frames in merged.items()}
+
+def resolve_dimensions(members, db: Session):
+    """Upsert dimension members and return the natural key -> id maps."""
+    inserted = []
+
+    def resolve(dim, frame):
+        key_map, added = _resolve_dimension(db, dim, frame)
+        inserted.append(added)
+        return key_map
+
+    maps = {}
+
+    # Region
+    if 'region' in members:
+        maps['region'] = resolve('region', members['region'])
+
+    # Manager
+    if 'manager' in members:
+        managers = members['manager'].rename(columns={'manager': 'name'})
+        maps['manager'] = resolve('manager', managers)
+
+    # Supplier
+    if 'supplier' in members:
+        suppliers = members['supplier'].rename(
+            columns={'supplier_name': 'name', 'supplier_country': 'country'})
+        maps['supplier'] = resolve('supplier', suppliers)
+
+    # Category
+    if 'category' in members:
+        categories = members['category'].rename(columns={'category': 'name'})
+        maps['category'] = resolve('category', categories)
+
+    # Product
+    if 'product' in members:
+        cat_map = maps.get('category') or dim_cache.cache.key_map(db, 'category')
+        products = members['product'].drop_duplicates(subset=['product_id'])
+        products = pd.DataFrame({
+            'business_id': products['product_id'],
+            'name': products['product_name'],
+            'brand': products['brand'],
+            'category_id': products['category'].map(cat_map).astype('Int64'),
+        })
+        maps['product'] = resolve('product', products)
+
+    # Date
+    if 'date' in members:
+        dates = pd.Series(members['date']['date'].unique())
+        stamps = pd.to_datetime(dates)
+        dates = pd.DataFrame({
+            'date': dates,
+            'year': stamps.dt.year,
+            'quarter': stamps.dt.quarter,
+            'month': stamps.dt.month,
+            'day': stamps.dt.day,
+            'month_name': stamps.dt.strftime('%B'),
+            'day_name': stamps.dt.strftime('%A'),
+        })
+        maps['date'] = resolve('date', dates)
+
+    if any(inserted):
+        # Commit only when something was added, so a caller's open
+        # transaction (and its row locks) survives a fully cached lookup
+        db.commit()
+        dim_cache.cache.invalidate()
+        result_cache.invalidate()
+    return maps
+
+def load_dimensions(df: pd.DataFrame, db: Session):
+    """Upsert every dimension member referenced by df.
+
+    Returns the lookup maps the fact stage needs: region, manager, supplier,
+    category, product and date, each natural key -> surrogate id.
+    """
+    return resolve_dimensions(dimension_members(df), db)
+
+FACT_COLUMNS = [
+    'sale_id', 'date_id', 'product_id', 'manager_id', 'supplier_id', 'region_id',
+    'quantity', 'unit_price', 'discount', 'revenue', 'payment_type', 'sales_channel',
+]
+
+def build_facts(df: pd.DataFrame, maps, existing_ids=None) -> pd.DataFrame:
+    """Columnar transform of source rows into fact_sales rows.
+
+    Surrogate keys are mapped column-wise from the dimension maps returned by
+    load_dimensions; rows whose sale_id is in existing_ids are dropped.
+    """
+    df = df.drop_duplicates(subset=['sale_id'])
+    if existing_ids:
+        df = df[~df['sale_id'].isin(existing_ids)]
+
+    regions = pd.DataFrame(
+        [(name, city, rid) for (name, city), rid in maps.get('region', {}).items()],
+        columns=['region_name', 'city', 'region_id'],
+    )
+    region_ids = df[['region_name', 'city']].merge(regions, on=['region_name', 'city'], how='left')['region_id']
+
+    quantity = df['quantity']
+    unit_price = df['unit_price']
+    discount = df['discount']
+    revenue = quantity * unit_price - discount
+    if 'revenue' in df.columns:
+        revenue = df['revenue'].fillna(revenue)
+
+    facts = pd.DataFrame({
+        'sale_id': df['sale_id'].values,
+        'date_id': df['date'].map(maps.get('date', {})).astype('Int64').values,
+        'product_id': df['product_id'].map(maps.get('product', {})).astype('Int64').values,
+        'manager_id': df['manager'].map(maps.get('manager', {})).astype('Int64').values,
+        'supplier_id': df['supplier_name'].map(maps.get('supplier', {})).astype('Int64').values,
+        'region_id': region_ids.astype('Int64').values,
+        'quantity': quantity.values,
+        'unit_price': unit_price.values,
+        'discount': discount.values,
+        'revenue': revenue.values,
+        'payment_type': df['payment_type'].values,
+        'sales_channel': df['sales_channel'].values,
+    }, columns=FACT_COLUMNS)
+    return facts
+
+def facts_committed(db: Session, sale_ids):
+    """Bookkeeping once new facts with these sale_ids are committed."""
+    result_cache.invalidate()
+    # Keep allocated sale_ids clear of the ids the input brought
+    id_allocator.sale_ids.observe(db, max(sale_ids))
+
+def process_data(df: pd.DataFrame, db: Session, batch_size: int = None, commit: bool = True):
+    """Load one frame of sales into the warehouse.
+
+    With commit=False the facts and rollup changes stay in the caller's
+    transaction; the caller commits and then calls facts_committed().
+    Dimension members are committed as soon as they are added.
+    """
     try:
         # 1. Dimensions
-        # Region
-        if 'region_name' in df.columns and 'city' in df.columns:
-            regions = df[['region_name', 'city']].drop_duplicates()
-            for _, row in regions.iterrows():
-                exists = db.query(models.DimRegion).filter_by(region_name=row['region_name'], city=row['city']).first()
-                if not exists:
-                    db.add(models.DimRegion(region_name=row['region_name'], city=row['city']))
-            db.commit()
-
-        # Manager
-        if 'manager' in df.columns:
-            managers = df['manager'].unique()
-            for name in managers:
-                if not db.query(models.DimManager).filter_by(name=name).first():
-                    db.add(models.DimManager(name=name))
-            db.commit()
-
-        # Supplier
-        if 'supplier_name' in df.columns:
-            suppliers = df[['supplier_name', 'supplier_country']].drop_duplicates()
-            for _, row in suppliers.iterrows():
-                if not db.query(models.DimSupplier).filter_by(name=row['supplier_name']).first():
-                    db.add(models.DimSupplier(name=row['supplier_name'], country=row['supplier_country']))
-            db.commit()
-
-        # Category
-        if 'category' in df.columns:
-            categories = df['category'].unique()
-            for cat in categories:
-                if not db.query(models.DimCategory).filter_by(name=cat).first():
-                    db.add(models.DimCategory(name=cat))
-            db.commit()
-        
-        # Product
-        if 'product_id' in df.columns:
-            # Need category map
-            cat_map = {c.name: c.id for c in db.query(models.DimCategory).all()}
-            products = df[['product_id', 'product_name', 'brand', 'category']].drop_duplicates(subset=['product_id'])
-            for _, row in products.iterrows():
-                if not db.query(models.DimProduct).filter_by(business_id=row['product_id']).first():
-                    db.add(models.DimProduct(
-                        business_id=row['product_id'],
-                        name=row['product_name'],
-                        brand=row['brand'],
-                        category_id=cat_map.get(row['category'])
-                    ))
-            db.commit()
-
-        # Date
-        # Convert sale_datetime to date
-        if 'sale_datetime' in df.columns:
-             df['date'] = pd.to_datetime(df['sale_datetime']).dt.date
-        
-        if 'date' in df.columns:
-            dates = df['date'].unique()
-            for d in dates:
-                if not db.query(models.DimDate).filter_by(date=d).first():
-                    db.add(models.DimDate(
-                        date=d,
-                        year=d.year,
-                        quarter=(d.month - 1) // 3 + 1,
-                        month=d.month,
-                        day=d.day,
-                        month_name=d.strftime('%B'),
-                        day_name=d.strftime('%A')
-                    ))
-            db.commit()
-
-        # 2. Re-map IDs for Fact Table
-        # Load all dims into memory for fast lookup
-        region_map = {(r.region_name, r.city): r.id for r in db.query(models.DimRegion).all()}
-        manager_map = {m.name: m.id for m in db.query(models.DimManager).all()}
-        supplier_map = {s.name: s.id for s in db.query(models.DimSupplier).all()}
-        product_map = {p.business_id: p.id for p in db.query(models.DimProduct).all()}
-        date_map = {d.date: d.id for d in db.query(models.DimDate).all()}
-
-        # 3. Facts
-        # Filter existing (by sale_id)
-        existing_ids = {s.sale_id for s in db.query(models.FactSales.sale_id).all()}
-        
-        sales_to_insert = []
-        for index, row in df.iterrows():
-            if row['sale_id'] in existing_ids:
-                continue
-
-            sale = models.FactSales(
-                sale_id=row['sale_id'],
-                date_id=date_map.get(row['date']),
-                product_id=product_map.get(row['product_id']),
-                manager_id=manager_map.get(row['manager']),
-                supplier_id=supplier_map.get(row['supplier_name']),
-                region_id=region_map.get((row['region_name'], row['city'])),
-                quantity=row['quantity'],
-                unit_price=row['unit_price'],
-                discount=row['discount'],
-                revenue=row['revenue'] if 'revenue' in df.columns else (row['quantity'] * row['unit_price'] - row['discount']),
-                payment_type=row['payment_type'],
-                sales_channel=row['sales_channel']
-            )
-            sales_to_insert.append(sale)
-        
-        db.add_all(sales_to_insert)
+        maps = load_dimensions(df, db)
+
+        # 2. Facts
+        # Filter existing (by sale_id), looking up only this batch's keys
+        existing_ids = fact_writer.existing_sale_ids(db, df['sale_id'])
+        facts = build_facts(df, maps, existing_ids)
+
+        stats = fact_writer.write_facts(db, facts, batch_size)
+        rollups.apply_facts(db, facts)
+        if not commit:
+            return {
+                "message": "Success",
+                "rows_processed": len(df),
+                "rows_inserted": stats["rows"],
+                "rows_per_sec": stats["rows_per_sec"],
+            }
         db.commit()
+        if stats["rows"]:
+            facts_committed(db, facts['sale_id'])
 
-        return {"message": "Success", "rows_processed": len(df), "rows_inserted": len(sales_to_insert)}
+        return {
+            "message": "Success",
+            "rows_processed": len(df),
+            "rows_inserted": stats["rows"],
+            "rows_per_sec": stats["rows_per_sec"],
+        }
 
     except Exception as e:
         db.rollback()
         raise e
 
-def load_data(file_path: str = "fact_sales_diverse.csv"):
-    db = SessionLocal()
+def process_chunks(chunks, db: Session, batch_size: int = None, progress=None):
+    """Run process_data over an iterable of DataFrames, one chunk at a time.
+
+    Each chunk is resolved, inserted and committed before the next one is
+    read, so memory is bounded by the chunk size rather than the input size.
+    progress, if given, is called with the running totals after every chunk.
+    """
+    totals = {"message": "Success", "rows_processed": 0, "rows_inserted": 0, "chunks": 0}
+    started = time.perf_counter()
+    for chunk in chunks:
+        result = process_data(chunk, db, batch_size)
+        totals["rows_processed"] += result["rows_processed"]
+        totals["rows_inserted"] += result["rows_inserted"]
+        totals["chunks"] += 1
+        del chunk
+        if progress:
+            progress(totals)
+    seconds = time.perf_counter() - started
+    totals["rows_per_sec"] = totals["rows_inserted"] / seconds if seconds > 0 else 0.0
+    return totals
+
+def read_chunks(file_path: str, chunksize: int = None):
+    """DataFrames for a CSV file, ETL_CHUNK_SIZE rows at a time by default."""
+    if chunksize is None:
+        chunksize = ETL_CHUNK_SIZE
+    if chunksize > 0:
+        return pd.read_csv(file_path, chunksize=chunksize)
+    return [pd.read_csv(file_path)]
+
+def load_data(file_path: str = "fact_sales_diverse.csv", chunksize: int = None, batch_size: int = None, progress=None):
+    db = EtlSessionLocal()
     try:
-        df = pd.read_csv(file_path)
-        return process_data(df, db)
+        return process_chunks(read_chunks(file_path, chunksize), db, batch_size, progress)
     except Exception as e:
         print(f"Error loading data: {e}")
         raise e
@@ -134,7 +342,6 @@ def load_data(file_path: str = "fact_sales_diverse.csv"):
         db.close()
 
 
-
 if __name__ == "__main__":
     print("Starting ETL...")
     result = load_data()
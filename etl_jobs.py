@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from database import EtlSessionLocal
+import etl
+
+# ETL loads allowed to run at once; each holds one database connection
+ETL_MAX_WORKERS = int(os.getenv("ETL_MAX_WORKERS", "2"))
+# Jobs allowed to wait for a worker before submissions are refused
+ETL_MAX_PENDING = int(os.getenv("ETL_MAX_PENDING", "8"))
+# Finished jobs kept around for GET /etl/jobs/{id}
+ETL_JOB_HISTORY = int(os.getenv("ETL_JOB_HISTORY", "100"))
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class ETLJob:
+    def __init__(self, kind: str, source: str = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.source = source
+        self.status = "queued"
+        self.phase = "queued"
+        self.rows_processed = 0
+        self.rows_inserted = 0
+        self.chunks = 0
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def update(self, totals):
+        self.rows_processed = totals["rows_processed"]
+        self.rows_inserted = totals["rows_inserted"]
+        self.chunks = totals["chunks"]
+
+    @property
+    def rows_per_sec(self):
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.rows_processed / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "source": self.source,
+            "status": self.status,
+            "phase": self.phase,
+            "rows_processed": self.rows_processed,
+            "rows_inserted": self.rows_inserted,
+            "chunks": self.chunks,
+            "rows_per_sec": self.rows_per_sec,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ETLJobRunner:
+    """Runs etl.process_chunks on a bounded thread pool.
+
+    At most max_workers loads run at once and at most max_pending wait for a
+    worker, so bulk uploads cannot take every connection the API needs.
+    """
+
+    def __init__(self, max_workers: int = ETL_MAX_WORKERS, max_pending: int = ETL_MAX_PENDING,
+                 history: int = ETL_JOB_HISTORY):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="etl-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, chunks, source: str = None, batch_size: int = None):
+        """Queue a load; chunks is a callable returning the DataFrames to process."""
+        with self._lock:
+            active = [j for j in self._jobs.values() if j.status in ("queued", "running")]
+            if len(active) >= self.max_workers + self.max_pending:
+                raise JobQueueFull("Too many ETL jobs in progress, try again later")
+            job = ETLJob(kind, source)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, chunks, batch_size)
+        return job
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.submitted_at, reverse=True)
+
+    def _run(self, job: ETLJob, chunks, batch_size):
+        job.status = "running"
+        job.phase = "loading"
+        job.started_at = time.time()
+        db = EtlSessionLocal()
+        try:
+            result = etl.process_chunks(chunks(), db, batch_size, progress=job.update)
+            job.update(result)
+            job.status = "succeeded"
+            job.phase = "finished"
+        except Exception as e:
+            job.status = "failed"
+            job.phase = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            db.close()
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished_at]
+        finished.sort(key=lambda j: j.finished_at)
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+
+
+runner = ETLJobRunner()
@@ -0,0 +1,208 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import select, Integer, Float, Numeric, Date, DateTime
+
+import reports
+from models import FactSales, DimDate, DimProduct, DimCategory, DimManager, DimSupplier, DimRegion
+
+# Rows fetched from the server-side cursor and encoded per step
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+
+# Format -> (media type, file extension)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+# Export column -> source column, one flat row per sale
+SALES_COLUMNS = {
+    "id": FactSales.id,
+    "sale_id": FactSales.sale_id,
+    "date": DimDate.date,
+    "product": DimProduct.name,
+    "category": DimCategory.name,
+    "manager": DimManager.name,
+    "supplier": DimSupplier.name,
+    "region": DimRegion.region_name,
+    "city": DimRegion.city,
+    "quantity": FactSales.quantity,
+    "unit_price": FactSales.unit_price,
+    "discount": FactSales.discount,
+    "revenue": FactSales.revenue,
+    "payment_type": FactSales.payment_type,
+    "sales_channel": FactSales.sales_channel,
+}
+
+
+class UnsupportedExport(Exception):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise UnsupportedExport("Arrow exports need pyarrow installed")
+    return pyarrow
+
+
+def check_format(fmt: str):
+    """Raise UnsupportedExport if fmt cannot be encoded here, before streaming starts."""
+    if fmt == "arrow":
+        _pyarrow()
+
+
+def arrow_type(sql_type):
+    pa = _pyarrow()
+    if isinstance(sql_type, Integer):
+        return pa.int64()
+    if isinstance(sql_type, Float):
+        return pa.float64()
+    if isinstance(sql_type, Numeric):
+        return pa.decimal128(sql_type.precision or 38, sql_type.scale or 0)
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+class Export:
+    """A query to stream: its statement, output columns and row conversion."""
+
+    def __init__(self, name: str, statement, columns, convert=None):
+        self.name = name
+        self.statement = statement
+        # [(column name, SQL type)]
+        self.columns = columns
+        # rows of one batch -> tuples in column order
+        self.convert = convert or (lambda rows: rows)
+
+
+def sales_export(**filters) -> Export:
+    """Every sale with its dimension names, filtered like /reports/aggregate."""
+    stmt = select(*[col.label(name) for name, col in SALES_COLUMNS.items()]).select_from(FactSales)
+    for table, (model, onclause) in reports.FACTS.joins.items():
+        # Products may have no category
+        stmt = stmt.outerjoin(model, onclause) if table == "category" else stmt.join(model, onclause)
+    for name, value in filters.items():
+        if value:
+            if name not in reports.FACTS.filters:
+                raise ValueError(f"Invalid filter: {name}")
+            stmt = stmt.where(reports.FACTS.filters[name][0](value))
+    columns = [(name, col.type) for name, col in SALES_COLUMNS.items()]
+    return Export("sales", stmt.order_by(FactSales.id), columns)
+
+
+def aggregate_export(dimensions, metric: str = "revenue", **filters) -> Export:
+    """The /reports/aggregate query for the same arguments, as flat rows."""
+    plan = reports.AggregatePlan(dimensions, reports.parse_metrics(metric), filters)
+    names = [f"d{i + 1}" for i in range(len(dimensions))] + plan.metrics + ["value"]
+    columns = [(f"d{i + 1}", plan.source.dimensions[d][0].type) for i, d in enumerate(dimensions)]
+    columns += [(name, Float()) for name in plan.metrics + ["value"]]
+    convert = lambda rows: [tuple(item[n] for n in names) for item in plan.format(rows)]
+    return Export("aggregate", plan.statement(), columns, convert)
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class CsvEncoder:
+    def __init__(self, columns):
+        self.names = [name for name, _ in columns]
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def _take(self) -> bytes:
+        data = self.buffer.getvalue().encode()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def begin(self) -> bytes:
+        self.writer.writerow(self.names)
+        return self._take()
+
+    def encode(self, rows) -> bytes:
+        self.writer.writerows(rows)
+        return self._take()
+
+    def end(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    def __init__(self, columns):
+        self.names = [name for name, _ in columns]
+
+    def begin(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(self.names, row)), default=_json_value) + "\n" for row in rows
+        ).encode()
+
+    def end(self) -> bytes:
+        return b""
+
+
+class ArrowEncoder:
+    """Arrow IPC stream: one record batch per fetched batch."""
+
+    def __init__(self, columns):
+        self.pa = _pyarrow()
+        self.schema = self.pa.schema([(name, arrow_type(sql_type)) for name, sql_type in columns])
+        self.buffer = io.BytesIO()
+        self.writer = None
+
+    def _take(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def begin(self) -> bytes:
+        self.writer = self.pa.ipc.new_stream(self.buffer, self.schema)
+        return self._take()
+
+    def encode(self, rows) -> bytes:
+        values = list(zip(*rows)) if rows else [[] for _ in self.schema]
+        arrays = [self.pa.array(col, type=field.type) for col, field in zip(values, self.schema)]
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self._take()
+
+    def end(self) -> bytes:
+        self.writer.close()
+        return self._take()
+
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "arrow": ArrowEncoder}
+
+
+async def stream(session_factory, export: Export, fmt: str, batch_rows: int = None):
+    """Encoded chunks of export's rows, read from a server-side cursor.
+
+    Opens its own session, since a StreamingResponse body runs after the
+    request's dependencies are closed. Only one batch of rows is held in
+    memory at a time; rows are never validated through Pydantic.
+    """
+    encoder = ENCODERS[fmt](export.columns)
+    batch_rows = batch_rows or EXPORT_BATCH_ROWS
+    yield encoder.begin()
+    async with session_factory() as db:
+        result = await db.stream(export.statement.execution_options(yield_per=batch_rows))
+        async for rows in result.partitions():
+            yield encoder.encode(export.convert(rows))
+    yield encoder.end()
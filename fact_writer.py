@@ -0,0 +1,139 @@
+import io
+import os
+import sqlite3
+import time
+
+import pandas as pd
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+import models
+
+# Rows per COPY / executemany / multi-row INSERT batch
+FACT_BATCH_SIZE = int(os.getenv("FACT_BATCH_SIZE", "5000"))
+
+# Most bind parameters a single multi-row INSERT may carry, per dialect
+MAX_BIND_PARAMS = {
+    "sqlite": 32766 if sqlite3.sqlite_version_info >= (3, 32) else 999,
+    "postgresql": 32767,
+    "mssql": 2100,
+}
+DEFAULT_MAX_BIND_PARAMS = 2000
+
+NULL_MARKER = "\\N"
+
+# sale_ids per IN list when checking which incoming facts already exist
+SALE_ID_PROBE_SIZE = 2000
+
+
+def _rows(frame: pd.DataFrame):
+    """Frame rows as tuples of plain Python values with NaN replaced by None."""
+    values = frame.astype(object).where(frame.notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def _batches(frame: pd.DataFrame, size: int):
+    for start in range(0, len(frame), size):
+        yield frame.iloc[start:start + size]
+
+
+def _copy_postgres(db: Session, facts: pd.DataFrame, batch_size: int):
+    """COPY FROM STDIN on the session's own connection (psycopg2 or psycopg 3)."""
+    columns = ", ".join(facts.columns)
+    sql = f"COPY {models.FactSales.__tablename__} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')"
+    cursor = db.connection().connection.cursor()
+    try:
+        for batch in _batches(facts, batch_size):
+            buf = io.StringIO()
+            batch.to_csv(buf, index=False, header=False, na_rep=NULL_MARKER)
+            buf.seek(0)
+            if hasattr(cursor, "copy_expert"):
+                cursor.copy_expert(sql, buf)
+            else:
+                with cursor.copy(sql) as copy:
+                    copy.write(buf.getvalue())
+    finally:
+        cursor.close()
+
+
+def _executemany_pyodbc(db: Session, facts: pd.DataFrame, batch_size: int):
+    """Parameter-array INSERT through pyodbc's fast_executemany."""
+    columns = ", ".join(facts.columns)
+    placeholders = ", ".join("?" for _ in facts.columns)
+    sql = f"INSERT INTO {models.FactSales.__tablename__} ({columns}) VALUES ({placeholders})"
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.fast_executemany = True
+        for batch in _batches(facts, batch_size):
+            cursor.executemany(sql, _rows(batch))
+    finally:
+        cursor.close()
+
+
+def _insert_values(db: Session, facts: pd.DataFrame, batch_size: int):
+    """Multi-row Core INSERT ... VALUES, sized to the dialect's bind parameter limit."""
+    dialect = db.get_bind().dialect.name
+    max_params = MAX_BIND_PARAMS.get(dialect, DEFAULT_MAX_BIND_PARAMS)
+    size = max(1, min(batch_size, max_params // len(facts.columns)))
+    table = models.FactSales.__table__
+    columns = list(facts.columns)
+    for batch in _batches(facts, size):
+        rows = [dict(zip(columns, row)) for row in _rows(batch)]
+        db.execute(insert(table).values(rows))
+
+
+def existing_sale_ids(db: Session, sale_ids):
+    """The subset of sale_ids already present in fact_sales.
+
+    Probes the unique sale_id index with chunked IN lists, so the cost
+    follows the number of incoming keys rather than the size of the table.
+    """
+    sale_ids = [int(s) for s in pd.unique(pd.Series(sale_ids).dropna())]
+    dialect = db.get_bind().dialect.name
+    size = min(SALE_ID_PROBE_SIZE, MAX_BIND_PARAMS.get(dialect, DEFAULT_MAX_BIND_PARAMS) - 1)
+    found = set()
+    for start in range(0, len(sale_ids), size):
+        chunk = sale_ids[start:start + size]
+        rows = db.execute(
+            select(models.FactSales.sale_id).where(models.FactSales.sale_id.in_(chunk))
+        ).scalars()
+        found.update(rows)
+    return found
+
+
+def write_method(db: Session):
+    """Name of the bulk path write_facts will take for this session's dialect."""
+    dialect = db.get_bind().dialect
+    if dialect.name == "postgresql" and dialect.driver in ("psycopg2", "psycopg"):
+        return "copy"
+    if dialect.name == "mssql" and dialect.driver == "pyodbc":
+        return "fast_executemany"
+    return "insert_values"
+
+
+def write_facts(db: Session, facts: pd.DataFrame, batch_size: int = None):
+    """Bulk insert a build_facts frame into fact_sales.
+
+    Uses COPY on PostgreSQL, fast_executemany on MSSQL/pyodbc and batched
+    multi-row INSERTs elsewhere. Runs inside the caller's transaction; the
+    caller commits. Returns row count, elapsed seconds and rows/sec.
+    """
+    batch_size = batch_size or FACT_BATCH_SIZE
+    method = write_method(db)
+    started = time.perf_counter()
+
+    if len(facts):
+        if method == "copy":
+            _copy_postgres(db, facts, batch_size)
+        elif method == "fast_executemany":
+            _executemany_pyodbc(db, facts, batch_size)
+        else:
+            _insert_values(db, facts, batch_size)
+
+    seconds = time.perf_counter() - started
+    return {
+        "method": method,
+        "rows": len(facts),
+        "seconds": seconds,
+        "rows_per_sec": len(facts) / seconds if seconds > 0 else 0.0,
+    }
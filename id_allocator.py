@@ -0,0 +1,148 @@
+import os
+import threading
+import weakref
+
+from sqlalchemy import select, func, update, insert, text
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from sqlalchemy.orm import Session
+
+from models import FactSales, OltpSale, IdBlock
+
+# Ids reserved per round trip; the rest of a block is handed out from memory
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "100"))
+
+
+class IdAllocator:
+    """Unique, never reused ids for one namespace, reserved in blocks.
+
+    PostgreSQL and SQL Server reserve a block with one call to a sequence
+    that increments by the block size; other databases bump a row in
+    id_blocks. Reservations commit on their own connection, so they never
+    wait for or roll back with the caller's transaction. Ids lost to a
+    rollback or a restart leave gaps, never duplicates.
+    """
+
+    def __init__(self, name: str, seed, block_size: int = ID_BLOCK_SIZE):
+        self.name = name
+        self.sequence = f"{name}_seq"
+        self.seed = seed
+        self.block_size = block_size
+        # engine -> [next id, end of block]
+        self._blocks = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def next_id(self, db: Session) -> int:
+        return self.allocate(db, 1)[0]
+
+    def allocate(self, db: Session, count: int):
+        """count fresh ids, reserving new blocks only when memory runs out."""
+        engine = db.get_bind()
+        ids = []
+        with self._lock:
+            block = self._blocks.get(engine)
+            while len(ids) < count:
+                if block is None or block[0] >= block[1]:
+                    start = self._reserve(engine)
+                    block = [start, start + self.block_size]
+                    self._blocks[engine] = block
+                take = min(count - len(ids), block[1] - block[0])
+                ids.extend(range(block[0], block[0] + take))
+                block[0] += take
+        return ids
+
+    def observe(self, db: Session, value: int):
+        """Make sure ids already used elsewhere (e.g. loaded by ETL) are never handed out.
+
+        Call after the caller's transaction has committed. Blocks other
+        processes already hold in memory are not recalled, so keep
+        ID_BLOCK_SIZE small where files bring their own sale_ids.
+        """
+        engine = db.get_bind()
+        value = int(value)
+        with self._lock:
+            block = self._blocks.get(engine)
+            if block is not None and block[0] <= value:
+                block[0] = min(value + 1, block[1])
+            with engine.begin() as conn:
+                self._advance(conn, value)
+
+    def _seed(self, conn) -> int:
+        return int(self.seed(conn) or 0) + 1
+
+    def _reserve(self, engine) -> int:
+        with engine.begin() as conn:
+            dialect = conn.dialect.name
+            if dialect == "postgresql":
+                self._ensure_sequence(conn)
+                return conn.execute(text(f"SELECT nextval('{self.sequence}')")).scalar()
+            if dialect == "mssql":
+                self._ensure_sequence(conn)
+                return conn.execute(text(f"SELECT NEXT VALUE FOR {self.sequence}")).scalar()
+            return self._reserve_row(conn)
+
+    def _ensure_sequence(self, conn):
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": self.sequence}).scalar()
+        else:
+            exists = conn.execute(text("SELECT 1 FROM sys.sequences WHERE name = :name"),
+                                  {"name": self.sequence}).scalar()
+        if exists:
+            return
+        ddl = (f"CREATE SEQUENCE {self.sequence} AS BIGINT START WITH {self._seed(conn)} "
+               f"INCREMENT BY {self.block_size}")
+        try:
+            with conn.begin_nested():
+                conn.execute(text(ddl))
+        except DBAPIError:
+            # Created by another process in the meantime
+            pass
+
+    def _reserve_row(self, conn) -> int:
+        table = IdBlock.__table__
+        bump = update(table).where(table.c.name == self.name) \
+            .values(next_value=table.c.next_value + self.block_size)
+        if conn.execute(bump).rowcount == 0:
+            start = self._seed(conn)
+            try:
+                conn.execute(insert(table).values(name=self.name, next_value=start + self.block_size))
+                return start
+            except IntegrityError:
+                # Another process inserted the row first
+                conn.execute(bump)
+        return conn.execute(select(table.c.next_value).where(table.c.name == self.name)).scalar() \
+            - self.block_size
+
+    def _advance(self, conn, value: int):
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            self._ensure_sequence(conn)
+            conn.execute(text(f"SELECT setval('{self.sequence}', :value) "
+                              f"WHERE :value > (SELECT last_value FROM {self.sequence})"), {"value": value})
+        elif dialect == "mssql":
+            self._ensure_sequence(conn)
+            row = conn.execute(text("SELECT CAST(start_value AS BIGINT), CAST(last_used_value AS BIGINT) "
+                                    "FROM sys.sequences WHERE name = :name"), {"name": self.sequence}).one_or_none()
+            if row is None:
+                return
+            # The value NEXT VALUE FOR would return: every block handed out so far
+            # ends before it, so restarting never moves the sequence back into one
+            start, last_used = row
+            next_value = start if last_used is None else last_used + self.block_size
+            if next_value <= value:
+                conn.execute(text(f"ALTER SEQUENCE {self.sequence} RESTART WITH {value + 1}"))
+        else:
+            table = IdBlock.__table__
+            conn.execute(update(table).where(table.c.name == self.name, table.c.next_value <= value)
+                         .values(next_value=value + 1))
+
+
+def _max_sale_id(conn):
+    """Highest sale_id in the warehouse or the OLTP table."""
+    return max(
+        conn.execute(select(func.max(FactSales.sale_id))).scalar() or 0,
+        conn.execute(select(func.max(OltpSale.sale_id))).scalar() or 0,
+    )
+
+
+sale_ids = IdAllocator("sale_id", _max_sale_id)
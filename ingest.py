@@ -0,0 +1,128 @@
+import os
+import tempfile
+
+import pandas as pd
+from fastapi import UploadFile
+
+import etl
+
+# Largest upload accepted by /upload/sales, in bytes (default 2 GiB)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+# Bytes read from the request body per step while spooling to disk
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+FILE_KINDS = {
+    ".xlsx": "xlsx",
+    ".xlsm": "xlsx",
+    ".xls": "xls",
+    ".csv": "csv",
+    ".parquet": "parquet",
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UnsupportedUpload(Exception):
+    pass
+
+
+def file_kind(filename: str):
+    """Upload format from the file extension, or None if it is not supported."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    return FILE_KINDS.get(ext)
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = None) -> str:
+    """Copy an upload to a temp file block by block and return its path.
+
+    The request body is never held in memory as a whole; uploads larger
+    than max_bytes are rejected with UploadTooLarge.
+    """
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await file.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+                out.write(block)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _xlsx_frames(path: str, chunksize: int):
+    """Stream the first worksheet with openpyxl in read-only mode."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(header)]
+        batch = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def _csv_frames(path: str, chunksize: int):
+    yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def _parquet_frames(path: str, chunksize: int):
+    """Read a Parquet file batch by batch, never more than one row group at a time."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise UnsupportedUpload("Parquet uploads need pyarrow installed")
+
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def _xls_frames(path: str, chunksize: int):
+    # Legacy .xls has no streaming reader; it is loaded whole
+    yield pd.read_excel(path)
+
+
+READERS = {
+    "xlsx": _xlsx_frames,
+    "csv": _csv_frames,
+    "parquet": _parquet_frames,
+    "xls": _xls_frames,
+}
+
+
+def read_frames(path: str, kind: str, chunksize: int = None, remove: bool = True):
+    """DataFrames of at most chunksize rows from a spooled upload.
+
+    The temp file is deleted once the frames are exhausted (or the
+    generator is closed) unless remove is False.
+    """
+    chunksize = chunksize or etl.ETL_CHUNK_SIZE or 50000
+    try:
+        yield from READERS[kind](path, chunksize)
+    finally:
+        if remove and os.path.exists(path):
+            os.remove(path)
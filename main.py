@@ -1,17 +1,38 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Any, Union
+import os
+import time
 import models
 import schemas
 import crud
 import etl
+import etl_jobs
+import etl_parallel
+import ingest
+import dim_cache
+import cube
+import reports
+import dashboard
+import rollups
+import result_cache
 import oltp_crud
-from database import engine, get_db
+import oltp_sync
+import pagination
+import counts
+import export
+import database
+from database import engine, get_db, get_etl_db, get_analytics_db, SessionLocal
 
 models.Base.metadata.create_all(bind=engine)
 
+with SessionLocal() as startup_db:
+    rollups.ensure_built(startup_db)
+
 app = FastAPI(title="Sales Analytics API")
 
 app.add_middleware(
@@ -20,52 +41,137 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, pagination.PREV_CURSOR_HEADER,
+                    counts.TOTAL_COUNT_HEADER, counts.TOTAL_APPROXIMATE_HEADER,
+                    database.LAST_WRITE_HEADER],
 )
 
-@app.post("/etl/load", response_model=schemas.ETLResult)
-def run_etl():
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+@app.middleware("http")
+async def remember_writes(request: Request, call_next):
+    """Hand clients their write time so their next reads skip the replica."""
+    response = await call_next(request)
+    if request.method in WRITE_METHODS and response.status_code < 400 and database.READ_YOUR_WRITES_SECONDS > 0:
+        now = time.time()
+        response.headers[database.LAST_WRITE_HEADER] = f"{now:.3f}"
+        response.set_cookie(database.LAST_WRITE_COOKIE, f"{now:.3f}",
+                            max_age=int(database.READ_YOUR_WRITES_SECONDS) + 1, httponly=True, samesite="lax")
+    return response
+
+@app.on_event("startup")
+def start_oltp_sync():
+    # No-op unless OLTP_SYNC_INTERVAL is set
+    oltp_sync.scheduler.start()
+
+@app.on_event("shutdown")
+def stop_oltp_sync():
+    oltp_sync.scheduler.stop()
+
+def submit_etl_job(kind: str, chunks, source: str = None, batch_size: int = None):
+    try:
+        job = etl_jobs.runner.submit(kind, chunks, source=source, batch_size=batch_size)
+    except etl_jobs.JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+@app.post("/etl/load", response_model=Union[schemas.ETLResult, schemas.ETLJobStatus])
+def run_etl(chunksize: int = None, batch_size: int = None, background: bool = False, workers: int = None):
+    if workers and workers > 1:
+        try:
+            return etl_parallel.load_data_parallel(workers=workers, batch_size=batch_size)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    if background:
+        path = "fact_sales_diverse.csv"
+        return submit_etl_job("load", lambda: etl.read_chunks(path, chunksize), source=path, batch_size=batch_size)
     try:
-        result = etl.load_data()
+        result = etl.load_data(chunksize=chunksize, batch_size=batch_size)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/etl/jobs", response_model=List[schemas.ETLJobStatus])
+def list_etl_jobs():
+    return [job.to_dict() for job in etl_jobs.runner.list()]
+
+@app.get("/etl/jobs/{job_id}", response_model=schemas.ETLJobStatus)
+def read_etl_job(job_id: str):
+    job = etl_jobs.runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="ETL job not found")
+    return job.to_dict()
+
 @app.post("/upload/sales")
-async def upload_sales(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Invalid file type. Please upload an Excel file.")
-    
+async def upload_sales(
+    file: UploadFile = File(...),
+    background: bool = False,
+    chunksize: int = None,
+    batch_size: int = None,
+    db: Session = Depends(get_etl_db)
+):
+    kind = ingest.file_kind(file.filename)
+    if not kind:
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload an Excel, CSV or Parquet file.")
+
+    try:
+        path = await ingest.spool_upload(file)
+    except ingest.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # Ensure column names map to what process_data expects
+    # For now assuming user provides correct headers
+    chunks = lambda: ingest.read_frames(path, kind, chunksize)
+
+    if background:
+        try:
+            return submit_etl_job("upload", chunks, source=file.filename, batch_size=batch_size)
+        except HTTPException:
+            # Rejected jobs never read the spooled file, so nothing else removes it
+            os.remove(path)
+            raise
+
     try:
-        contents = await file.read()
-        import pandas as pd
-        import io
-        
-        df = pd.read_excel(io.BytesIO(contents))
-        
-        # Ensure column names map to what process_data expects
-        # We might need to map user columns to our expected columns
-        # For now assuming user provides correct headers or we map common ones
-        
-        # Basic mapping if needed (optional)
-        # df.rename(columns={'Region': 'region_name', ...}, inplace=True)
-        
-        result = etl.process_data(df, db)
+        result = await run_in_threadpool(etl.process_chunks, chunks(), db, batch_size)
         return result
+    except ingest.UnsupportedUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
 
 @app.post("/sales", response_model=schemas.Sale)
 def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
     return crud.create_sale(db=db, sale=sale)
 
-@app.get("/sales", response_model=List[schemas.Sale])
-def read_sales(skip: int = 0, limit: int = 100, search: str = None, db: Session = Depends(get_db)):
-    sales = crud.get_sales(db, skip=skip, limit=limit, search=search)
-    return sales
+@app.get("/sales", response_model=List[Union[schemas.SaleWithNames, schemas.Sale]])
+async def read_sales(response: Response, skip: int = 0, limit: int = 100, search: str = None,
+                     after: str = None, before: str = None, with_total: bool = False, names: bool = False,
+                     db: AsyncSession = Depends(get_analytics_db)):
+    try:
+        page = await crud.get_sales_page_async(db, limit=limit, search=search, after=after, before=before,
+                                               skip=skip, names=names)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update(page.headers())
+    if with_total:
+        response.headers.update(counts.headers(await sales_count(db, search)))
+    # Serialize here so the schema matches what the page query loaded
+    schema = schemas.SaleWithNames if names else schemas.Sale
+    return [schema.model_validate(sale) for sale in page.items]
 
 @app.get("/sales/count")
-def read_sales_count(search: str = None, db: Session = Depends(get_db)):
-    return {"count": crud.get_sales_count(db, search=search)}
+async def read_sales_count(search: str = None, exact: bool = False, db: AsyncSession = Depends(get_analytics_db)):
+    return await sales_count(db, search, exact)
+
+async def sales_count(db: AsyncSession, search: str = None, exact: bool = False):
+    return await result_cache.cache.get_or_compute_async(
+        "sales/count", {"search": search, "exact": exact},
+        lambda: crud.count_sales_async(db, search=search, exact=exact),
+        replica=database.reads_replica(db),
+    )
 
 @app.put("/sales/{sale_id}", response_model=schemas.Sale)
 def update_sale(sale_id: int, sale: schemas.SaleCreate, db: Session = Depends(get_db)):
@@ -82,19 +188,105 @@ def delete_sale(sale_id: int, db: Session = Depends(get_db)):
     return {"message": "Success"}
 
 @app.get("/dims/{dim_name}", response_model=List[schemas.DimBase])
-def read_dims(dim_name: str, db: Session = Depends(get_db)):
-    return crud.get_dims(db, dim_name)
+async def read_dims(dim_name: str, db: AsyncSession = Depends(get_analytics_db)):
+    return await crud.get_dims_async(db, dim_name)
+
+
+@app.get("/internal/dim-cache")
+def read_dim_cache_stats():
+    return dim_cache.cache.stats()
+
+@app.get("/internal/cube")
+def read_cube_stats():
+    return cube.cube.stats()
 
+@app.get("/internal/pool")
+def read_pool_stats():
+    return database.pool_status()
+
+@app.get("/internal/result-cache")
+def read_result_cache_stats():
+    return result_cache.cache.stats()
 
 @app.get("/rankings/{entity_type}")
-def read_rankings(entity_type: str, limit: int = 5, db: Session = Depends(get_db)):
-    return crud.get_rankings(db, entity_type, limit)
+async def read_rankings(entity_type: str, limit: int = 5, db: AsyncSession = Depends(get_analytics_db)):
+    return await result_cache.cache.get_or_compute_async(
+        "rankings", {"entity_type": entity_type, "limit": limit},
+        lambda: crud.get_rankings_async(db, entity_type, limit),
+        replica=database.reads_replica(db),
+    )
 
 @app.get("/reports/aggregate")
-def read_aggregate_report(
+async def read_aggregate_report(
+    dimension1: str,
+    dimension2: str,
+    metric: str = 'revenue',
+    region: str = None,
+    manager: str = None,
+    category: str = None,
+    supplier: str = None,
+    product: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    report_engine: str = Query(None, alias="engine"),
+    db: AsyncSession = Depends(get_analytics_db)
+):
+    report_engine = report_engine or cube.REPORT_ENGINE
+    filters = dict(
+        region=region, manager=manager, category=category, supplier=supplier,
+        product=product, date_from=date_from, date_to=date_to,
+    )
+    try:
+        metrics = ",".join(reports.parse_metrics(metric))
+        return await result_cache.cache.get_or_compute_async(
+            "reports/aggregate",
+            {"dimensions": [dimension1, dimension2], "metric": metrics, "engine": report_engine, **filters},
+            lambda: reports.aggregate_report_async(db, [dimension1, dimension2], metrics, engine=report_engine,
+                                                   **filters),
+            replica=database.reads_replica(db),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def export_response(request: Request, data: export.Export, export_format: str):
+    try:
+        export.check_format(export_format)
+    except export.UnsupportedExport as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type, extension = export.FORMATS[export_format]
+    return StreamingResponse(
+        export.stream(database.analytics_sessionmaker(request), data, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{data.name}.{extension}"'},
+    )
+
+@app.get("/export/sales")
+async def export_sales(
+    request: Request,
+    export_format: str = Query("csv", alias="format"),
+    region: str = None,
+    manager: str = None,
+    category: str = None,
+    supplier: str = None,
+    product: str = None,
+    date_from: str = None,
+    date_to: str = None,
+):
+    if export_format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format: {export_format}")
+    data = export.sales_export(
+        region=region, manager=manager, category=category, supplier=supplier,
+        product=product, date_from=date_from, date_to=date_to,
+    )
+    return export_response(request, data, export_format)
+
+@app.get("/export/aggregate")
+async def export_aggregate(
+    request: Request,
     dimension1: str,
     dimension2: str,
     metric: str = 'revenue',
+    export_format: str = Query("csv", alias="format"),
     region: str = None,
     manager: str = None,
     category: str = None,
@@ -102,79 +294,63 @@ def read_aggregate_report(
     product: str = None,
     date_from: str = None,
     date_to: str = None,
-    db: Session = Depends(get_db)
 ):
-    dim_map = {
-        'region': models.DimRegion.region_name,
-        'manager': models.DimManager.name,
-        'category': models.DimCategory.name,
-        'product': models.DimProduct.name,
-        'supplier': models.DimSupplier.name,
-        'year': models.DimDate.year,
-        'quarter': models.DimDate.quarter,
-        'month': models.DimDate.month_name,
-    }
-    
-    col1 = dim_map.get(dimension1)
-    col2 = dim_map.get(dimension2)
-
-    if not col1 or not col2:
-        raise HTTPException(status_code=400, detail="Invalid dimension")
-
-    q = db.query(
-        col1.label("dim1"),
-        col2.label("dim2"),
-        func.sum(models.FactSales.revenue).label("value")
-    ).select_from(models.FactSales)
-
-    
-    q = q.join(models.DimDate).join(models.DimProduct).join(models.DimRegion).join(models.DimManager).join(models.DimSupplier)
-
-    q = q.join(models.DimCategory, models.DimProduct.category_id == models.DimCategory.id)
-
-    # Filters
-    if region:
-        q = q.filter(models.DimRegion.region_name == region)
-    if manager:
-        q = q.filter(models.DimManager.name == manager)
-    if category:
-        q = q.filter(models.DimCategory.name == category)
-    if supplier:
-        q = q.filter(models.DimSupplier.name == supplier)
-    if product:
-        q = q.filter(models.DimProduct.name == product)
-    if date_from:
-        q = q.filter(models.DimDate.date >= date_from)
-    if date_to:
-        q = q.filter(models.DimDate.date <= date_to)
-
-    q = q.group_by(col1, col2).all()
-    
-    return [{"d1": r[0], "d2": r[1], "value": float(r[2] or 0)} for r in q]
+    if export_format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format: {export_format}")
+    try:
+        data = export.aggregate_export(
+            [dimension1, dimension2], metric, region=region, manager=manager, category=category,
+            supplier=supplier, product=product, date_from=date_from, date_to=date_to,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return export_response(request, data, export_format)
+
+@app.post("/internal/rollups/rebuild")
+def rebuild_rollups(db: Session = Depends(get_db)):
+    rollups.rebuild(db)
+    return {"message": "Success"}
 
 @app.get("/dashboard/metrics")
-def read_dashboard_metrics(db: Session = Depends(get_db)):
-    total_revenue = db.query(func.sum(models.FactSales.revenue)).scalar() or 0
-    total_quantity = db.query(func.sum(models.FactSales.quantity)).scalar() or 0
-    count_sales = db.query(func.count(models.FactSales.id)).scalar() or 0
-    avg_check = total_revenue / count_sales if count_sales > 0 else 0
-    
-    return {
-        "total_revenue": total_revenue,
-        "total_quantity": total_quantity,
-        "count_sales": count_sales,
-        "avg_check": avg_check
-    }
+async def read_dashboard_metrics(
+    date_from: str = None,
+    date_to: str = None,
+    compare_from: str = None,
+    compare_to: str = None,
+    region: str = None,
+    manager: str = None,
+    category: str = None,
+    supplier: str = None,
+    product: str = None,
+    db: AsyncSession = Depends(get_analytics_db)
+):
+    params = dict(
+        date_from=date_from, date_to=date_to, compare_from=compare_from, compare_to=compare_to,
+        region=region, manager=manager, category=category, supplier=supplier, product=product,
+    )
+    return await result_cache.cache.get_or_compute_async(
+        "dashboard/metrics", params, lambda: dashboard.dashboard_metrics_async(db, **params),
+        replica=database.reads_replica(db),
+    )
 
 # ==================== OLTP Endpoints ====================
 
 @app.get("/oltp/sales", response_model=List[schemas.OltpSaleResponse])
-def read_oltp_sales(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
-    return oltp_crud.get_oltp_sales(db, skip=skip, limit=limit)
+async def read_oltp_sales(response: Response, skip: int = 0, limit: int = 20, after: str = None,
+                          before: str = None, with_total: bool = False,
+                          db: AsyncSession = Depends(get_analytics_db)):
+    try:
+        page = await oltp_crud.get_oltp_sales_page_async(db, limit=limit, after=after, before=before, skip=skip)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update(page.headers())
+    if with_total:
+        response.headers.update(counts.headers(await oltp_crud.count_oltp_sales_async(db)))
+    return page.items
 
 @app.get("/oltp/sales/count")
-def read_oltp_sales_count(db: Session = Depends(get_db)):
-    return {"count": oltp_crud.get_oltp_sales_count(db)}
+async def read_oltp_sales_count(exact: bool = False, db: AsyncSession = Depends(get_analytics_db)):
+    return await oltp_crud.count_oltp_sales_async(db, exact=exact)
 
 @app.post("/oltp/sales", response_model=schemas.OltpSaleResponse)
 def create_oltp_sale(sale: schemas.OltpSaleCreate, db: Session = Depends(get_db)):
@@ -195,9 +371,21 @@ def delete_oltp_sale(sale_id: int, db: Session = Depends(get_db)):
     return {"message": "Deleted"}
 
 @app.post("/oltp/transfer")
-def transfer_oltp_to_warehouse(req: schemas.TransferRequest, db: Session = Depends(get_db)):
+def transfer_oltp_to_warehouse(req: schemas.TransferRequest, db: Session = Depends(get_etl_db)):
     try:
         result = oltp_crud.transfer_to_warehouse(db, req.ids)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/oltp/sync")
+def sync_oltp_to_warehouse(batch_size: int = None, max_batches: int = None, full: bool = False,
+                           db: Session = Depends(get_etl_db)):
+    try:
+        return oltp_sync.sync(db, batch_size=batch_size, max_batches=max_batches, full=full)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/oltp/sync")
+def read_oltp_sync_status(db: Session = Depends(get_db)):
+    return {"watermark": oltp_sync.watermark(db), **oltp_sync.scheduler.status()}
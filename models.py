@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Numeric
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, ForeignKey, Numeric, UniqueConstraint, Index, DateTime, text
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -24,12 +24,19 @@ class DimCategory(Base):
 
 class DimProduct(Base):
     __tablename__ = "dim_product"
+    __table_args__ = (
+        # Filtered, since SQL Server's unique constraints allow only one NULL
+        Index("uq_dim_product_business_id", "business_id", unique=True,
+              postgresql_where=text("business_id IS NOT NULL"),
+              mssql_where=text("business_id IS NOT NULL"),
+              sqlite_where=text("business_id IS NOT NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     business_id = Column(Integer, nullable=True) 
     name = Column(String(255), nullable=False)
     brand = Column(String(100), nullable=True)
-    category_id = Column(Integer, ForeignKey("dim_category.id"))
+    category_id = Column(Integer, ForeignKey("dim_category.id"), index=True)
 
     category = relationship("DimCategory", back_populates="products")
 
@@ -41,6 +48,9 @@ class DimManager(Base):
 
 class DimSupplier(Base):
     __tablename__ = "dim_supplier"
+    __table_args__ = (
+        UniqueConstraint("name", name="uq_dim_supplier_name"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -48,6 +58,9 @@ class DimSupplier(Base):
 
 class DimRegion(Base):
     __tablename__ = "dim_region"
+    __table_args__ = (
+        UniqueConstraint("region_name", "city", name="uq_dim_region_name_city"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     region_name = Column(String(100), nullable=False)
@@ -57,8 +70,25 @@ class DimRegion(Base):
     def name(self):
         return f"{self.region_name} - {self.city}"
 
+# Measures copied into the covering indexes so report scans stay index-only
+# on PostgreSQL and SQL Server
+COVERED_MEASURES = ["quantity", "revenue"]
+
+
 class FactSales(Base):
     __tablename__ = "fact_sales"
+    __table_args__ = (
+        # Day-level report shapes: period x product / region / manager; the
+        # leading columns also serve the date_id, region_id and manager_id FKs
+        Index("ix_fact_sales_date_product", "date_id", "product_id",
+              postgresql_include=COVERED_MEASURES, mssql_include=COVERED_MEASURES),
+        Index("ix_fact_sales_region_date", "region_id", "date_id",
+              postgresql_include=COVERED_MEASURES, mssql_include=COVERED_MEASURES),
+        Index("ix_fact_sales_manager_date", "manager_id", "date_id",
+              postgresql_include=COVERED_MEASURES, mssql_include=COVERED_MEASURES),
+        # Product rankings read only these two columns; also the product_id FK index
+        Index("ix_fact_sales_product_revenue", "product_id", "revenue"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     sale_id = Column(Integer, unique=True, nullable=False) 
@@ -66,7 +96,7 @@ class FactSales(Base):
     date_id = Column(Integer, ForeignKey("dim_date.id"), nullable=False)
     product_id = Column(Integer, ForeignKey("dim_product.id"), nullable=False)
     manager_id = Column(Integer, ForeignKey("dim_manager.id"), nullable=False)
-    supplier_id = Column(Integer, ForeignKey("dim_supplier.id"), nullable=False)
+    supplier_id = Column(Integer, ForeignKey("dim_supplier.id"), nullable=False, index=True)
     region_id = Column(Integer, ForeignKey("dim_region.id"), nullable=False)
 
     quantity = Column(Integer, nullable=False)
@@ -88,11 +118,37 @@ class FactSales(Base):
     def date(self):
         return self.dim_date.date if self.dim_date else None
 
+    # Inline names for schemas.SaleWithNames; load the relationships with
+    # crud.sale_options(names=True) to keep them off the lazy path
+    @property
+    def product_name(self):
+        return self.product.name if self.product else None
+
+    @property
+    def category_name(self):
+        return self.product.category.name if self.product and self.product.category else None
+
+    @property
+    def manager_name(self):
+        return self.manager.name if self.manager else None
+
+    @property
+    def supplier_name(self):
+        return self.supplier.name if self.supplier else None
+
+    @property
+    def region_name(self):
+        return self.region.region_name if self.region else None
+
+    @property
+    def city(self):
+        return self.region.city if self.region else None
+
 class OltpSale(Base):
     __tablename__ = "oltp_sales"
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, nullable=False)
+    sale_id = Column(Integer, nullable=False, index=True)
     sale_datetime = Column(String(50), nullable=False)
     region_name = Column(String(100), nullable=False)
     city = Column(String(100), nullable=False)
@@ -109,4 +165,58 @@ class OltpSale(Base):
     revenue = Column(Numeric(10, 2), nullable=True)
     payment_type = Column(String(50), nullable=True)
     sales_channel = Column(String(50), nullable=True)
-    transferred = Column(Integer, default=0)  # 0 = not transferred, 1 = transferred
+    transferred = Column(Integer, default=0, index=True)  # 0 = not transferred, 1 = transferred
+
+class AggSalesMonthly(Base):
+    """Month x region x category x manager x supplier rollup of fact_sales.
+
+    Kept current with deltas by rollups.py; category_id 0 stands for
+    products without a category.
+    """
+    __tablename__ = "agg_sales_monthly"
+    __table_args__ = (
+        UniqueConstraint("year", "month", "region_id", "category_id", "manager_id", "supplier_id",
+                         name="uq_agg_sales_monthly_grain"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    year = Column(Integer, nullable=False)
+    quarter = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    month_name = Column(String(20), nullable=False)
+    region_id = Column(Integer, nullable=False)
+    category_id = Column(Integer, nullable=False)
+    manager_id = Column(Integer, nullable=False)
+    supplier_id = Column(Integer, nullable=False)
+
+    revenue = Column(Numeric(16, 2), nullable=False, default=0)
+    quantity = Column(BigInteger, nullable=False, default=0)
+    discount = Column(Numeric(16, 2), nullable=False, default=0)
+    unit_price = Column(Numeric(16, 2), nullable=False, default=0)
+    sale_count = Column(BigInteger, nullable=False, default=0)
+
+class SalesTotals(Base):
+    """Single running-totals row over all of fact_sales, kept by rollups.py."""
+    __tablename__ = "sales_totals"
+
+    id = Column(Integer, primary_key=True)
+    revenue = Column(Numeric(18, 2), nullable=False, default=0)
+    quantity = Column(BigInteger, nullable=False, default=0)
+    discount = Column(Numeric(18, 2), nullable=False, default=0)
+    unit_price = Column(Numeric(18, 2), nullable=False, default=0)
+    sale_count = Column(BigInteger, nullable=False, default=0)
+
+class IdBlock(Base):
+    """Next free id per namespace, for databases without sequences (see id_allocator.py)."""
+    __tablename__ = "id_blocks"
+
+    name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False)
+
+class SyncWatermark(Base):
+    """Highest source id a sync has moved into the warehouse (see oltp_sync.py)."""
+    __tablename__ = "sync_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
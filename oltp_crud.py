@@ -1,29 +1,56 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from models import OltpSale, FactSales
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, update
+from models import OltpSale
 import schemas
 import pandas as pd
 import etl
+import fact_writer
+import id_allocator
+import pagination
+import counts
 
 
 def get_oltp_sales(db: Session, skip: int = 0, limit: int = 20):
     return db.query(OltpSale).order_by(OltpSale.id.desc()).offset(skip).limit(limit).all()
 
 
+def get_oltp_sales_page(db: Session, limit: int = 20, after: str = None, before: str = None, skip: int = 0):
+    """Newest first; after/before are cursors from a previous page."""
+    return pagination.seek(db.query(OltpSale), OltpSale.id, limit, after=after, before=before,
+                           descending=True, skip=skip)
+
+
+async def get_oltp_sales_page_async(db: AsyncSession, limit: int = 20, after: str = None, before: str = None,
+                                    skip: int = 0):
+    """get_oltp_sales_page on an async session."""
+    stmt = pagination.seek_query(select(OltpSale), OltpSale.id, limit, after=after, before=before,
+                                 descending=True, skip=skip)
+    rows = (await db.execute(stmt)).scalars().all()
+    return pagination.seek_page(rows, OltpSale.id, limit, after=after, before=before, skip=skip)
+
+
 def get_oltp_sales_count(db: Session):
     return db.query(func.count(OltpSale.id)).scalar()
 
 
+def count_oltp_sales(db: Session, exact: bool = False):
+    """{"count", "approximate"}; large tables are counted from catalog statistics."""
+    return counts.table_count(db, OltpSale, exact=exact)
+
+
+async def count_oltp_sales_async(db: AsyncSession, exact: bool = False):
+    return await db.run_sync(count_oltp_sales, exact)
+
+
 def create_oltp_sale(db: Session, sale: schemas.OltpSaleCreate):
     # Auto-calculate revenue if not provided
     revenue = sale.revenue if sale.revenue is not None else (sale.quantity * sale.unit_price - sale.discount)
     
-    # Auto-generate sale_id if not provided — use max from BOTH tables to avoid collisions
+    # Auto-generate sale_id if not provided; shared with the warehouse, so no collisions
     sale_id = sale.sale_id
     if sale_id is None:
-        max_oltp = db.query(func.max(OltpSale.sale_id)).scalar() or 0
-        max_fact = db.query(func.max(FactSales.sale_id)).scalar() or 0
-        sale_id = max(max_oltp, max_fact) + 1
+        sale_id = id_allocator.sale_ids.next_id(db)
     
     # Auto-generate product_id if not provided
     product_id = sale.product_id
@@ -54,6 +81,9 @@ def create_oltp_sale(db: Session, sale: schemas.OltpSaleCreate):
     db.add(db_sale)
     db.commit()
     db.refresh(db_sale)
+    if sale.sale_id is not None:
+        # Explicit ids must never be handed out by the allocator later
+        id_allocator.sale_ids.observe(db, sale.sale_id)
     return db_sale
 
 
@@ -70,6 +100,8 @@ def update_oltp_sale(db: Session, sale_id: int, sale: schemas.OltpSaleCreate):
     
     db.commit()
     db.refresh(db_sale)
+    if sale.sale_id is not None:
+        id_allocator.sale_ids.observe(db, sale.sale_id)
     return db_sale
 
 
@@ -81,57 +113,82 @@ def delete_oltp_sale(db: Session, sale_id: int):
     return db_sale
 
 
+# OLTP columns that become the ETL input frame
+TRANSFER_COLUMNS = [
+    'sale_id', 'sale_datetime', 'region_name', 'city', 'manager', 'product_id', 'product_name',
+    'brand', 'category', 'supplier_name', 'supplier_country', 'quantity', 'unit_price',
+    'discount', 'revenue', 'payment_type', 'sales_channel',
+]
+
+
+def id_chunks(db: Session, ids):
+    """Sorted distinct ids split into IN lists within the dialect's bind parameter limit.
+
+    One parameter per statement is left for the transferred flag.
+    """
+    ids = sorted({int(i) for i in ids})
+    limit = fact_writer.MAX_BIND_PARAMS.get(db.get_bind().dialect.name, fact_writer.DEFAULT_MAX_BIND_PARAMS)
+    size = limit - 1
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+
+def untransferred(ids=None, after_id: int = None, limit: int = None):
+    """SELECT of untransferred OLTP rows (id plus TRANSFER_COLUMNS) in id order.
+
+    Pass at most one id_chunks() list as ids.
+    """
+    table = OltpSale.__table__
+    stmt = select(table.c.id, *[table.c[c] for c in TRANSFER_COLUMNS]).where(table.c.transferred == 0)
+    if ids is not None:
+        stmt = stmt.where(table.c.id.in_(ids))
+    if after_id is not None:
+        stmt = stmt.where(table.c.id > after_id)
+    stmt = stmt.order_by(table.c.id)
+    return stmt.limit(limit) if limit else stmt
+
+
+def warehouse_frame(db: Session, rows):
+    """ETL input for OLTP rows; sale_ids already in the warehouse or repeated
+    within the batch get fresh ones, so every row becomes a fact."""
+    df = pd.DataFrame([dict(r) for r in rows], columns=['id'] + TRANSFER_COLUMNS)
+    existing_fact_ids = fact_writer.existing_sale_ids(db, df['sale_id'])
+    colliding = df['sale_id'].isin(existing_fact_ids) | df['sale_id'].duplicated()
+    if colliding.any():
+        df.loc[colliding, 'sale_id'] = id_allocator.sale_ids.allocate(db, int(colliding.sum()))
+    for col in ('unit_price', 'discount', 'revenue'):
+        df[col] = df[col].astype(float)
+    # A zero revenue is recomputed from quantity, price and discount
+    df['revenue'] = df['revenue'].where(df['revenue'] != 0)
+    return df
+
+
+def mark_transferred(db: Session, ids):
+    """Flag OLTP rows as transferred, one UPDATE per id_chunks() list."""
+    for chunk in id_chunks(db, ids):
+        db.execute(update(OltpSale).where(OltpSale.id.in_(chunk)).values(transferred=1))
+
+
+def mark_loaded(db: Session, df: pd.DataFrame):
+    """Flag the rows of a warehouse_frame whose facts are now in fact_sales.
+
+    Runs in the loading transaction, after the facts are written; a row
+    whose fact was not inserted stays untransferred for the next run.
+    """
+    loaded = fact_writer.existing_sale_ids(db, df['sale_id'])
+    mark_transferred(db, df.loc[df['sale_id'].isin(loaded), 'id'])
+
+
 def transfer_to_warehouse(db: Session, ids: list[int]):
     """Transfer selected OLTP records to the OLAP warehouse."""
-    records = db.query(OltpSale).filter(
-        OltpSale.id.in_(ids),
-        OltpSale.transferred == 0
-    ).all()
-    
-    if not records:
+    rows = [row for chunk in id_chunks(db, ids) for row in db.execute(untransferred(ids=chunk)).mappings().all()]
+    if not rows:
         return {"message": "No records to transfer", "rows_processed": 0, "rows_inserted": 0}
-    
-    # Get existing sale_ids in FactSales to avoid collisions
-    existing_fact_ids = {s.sale_id for s in db.query(FactSales.sale_id).all()}
-    max_fact_id = max(existing_fact_ids) if existing_fact_ids else 0
-    max_oltp_id = db.query(func.max(OltpSale.sale_id)).scalar() or 0
-    next_id = max(max_fact_id, max_oltp_id) + 1
-    
-    # Convert to DataFrame matching ETL expected format
-    data = []
-    for r in records:
-        # Reassign sale_id if it already exists in FactSales
-        sid = r.sale_id
-        if sid in existing_fact_ids:
-            sid = next_id
-            next_id += 1
-        
-        data.append({
-            'sale_id': sid,
-            'sale_datetime': r.sale_datetime,
-            'region_name': r.region_name,
-            'city': r.city,
-            'manager': r.manager,
-            'product_id': r.product_id,
-            'product_name': r.product_name,
-            'brand': r.brand,
-            'category': r.category,
-            'supplier_name': r.supplier_name,
-            'supplier_country': r.supplier_country,
-            'quantity': r.quantity,
-            'unit_price': float(r.unit_price),
-            'discount': float(r.discount),
-            'revenue': float(r.revenue) if r.revenue else None,
-            'payment_type': r.payment_type,
-            'sales_channel': r.sales_channel,
-        })
-    
-    df = pd.DataFrame(data)
-    result = etl.process_data(df, db)
-    
-    # Mark as transferred
-    for r in records:
-        r.transferred = 1
+
+    df = warehouse_frame(db, rows)
+    # Facts, rollups and the transferred flags commit together
+    result = etl.process_data(df.drop(columns='id'), db, commit=False)
+    mark_loaded(db, df)
     db.commit()
-    
+    if result["rows_inserted"]:
+        etl.facts_committed(db, df['sale_id'])
     return result
@@ -0,0 +1,172 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.orm import Session
+
+from database import EtlSessionLocal
+from models import SyncWatermark
+import etl
+import oltp_crud
+
+# OLTP rows moved per transaction
+OLTP_SYNC_BATCH_SIZE = int(os.getenv("OLTP_SYNC_BATCH_SIZE", "1000"))
+# Seconds between scheduled syncs; 0 disables the scheduler
+OLTP_SYNC_INTERVAL = float(os.getenv("OLTP_SYNC_INTERVAL", "0"))
+# Every this many scheduled runs start from id 0, catching rows whose
+# insert committed after a higher id had already been synced
+OLTP_SYNC_FULL_EVERY = int(os.getenv("OLTP_SYNC_FULL_EVERY", "60"))
+# Watermark conflicts (another sync moved it mid-batch) retried per run
+# before giving up; retries never count against max_batches
+OLTP_SYNC_MAX_RETRIES = int(os.getenv("OLTP_SYNC_MAX_RETRIES", "10"))
+
+WATERMARK = "oltp_sales"
+
+logger = logging.getLogger(__name__)
+
+
+def watermark(db: Session, lock: bool = False) -> int:
+    stmt = select(SyncWatermark.last_id).where(SyncWatermark.name == WATERMARK)
+    if lock:
+        stmt = stmt.with_for_update()
+    return db.execute(stmt).scalar() or 0
+
+
+def _set_watermark(db: Session, last_id: int):
+    values = {"last_id": last_id, "updated_at": datetime.utcnow()}
+    updated = db.execute(update(SyncWatermark).where(SyncWatermark.name == WATERMARK).values(values))
+    if updated.rowcount == 0:
+        db.execute(insert(SyncWatermark).values(name=WATERMARK, **values))
+
+
+def sync_batch(db: Session, batch_size: int = None, after_id: int = None):
+    """Move the next batch of untransferred OLTP rows into the warehouse.
+
+    Facts, rollups, the transferred flags and the watermark commit in one
+    transaction. Returns the batch totals, or None when nothing is left;
+    a batch abandoned because the watermark moved has conflict=True.
+    """
+    batch_size = batch_size or OLTP_SYNC_BATCH_SIZE
+    start = watermark(db) if after_id is None else after_id
+    rows = db.execute(oltp_crud.untransferred(after_id=start, limit=batch_size)).mappings().all()
+    if not rows:
+        db.rollback()
+        return None
+
+    df = oltp_crud.warehouse_frame(db, rows)
+    # New dimension members commit here, before the watermark row is locked
+    etl.load_dimensions(df.drop(columns='id'), db)
+    current = watermark(db, lock=True)
+    if after_id is None and current != start:
+        # Another sync moved the watermark while this batch was read; reread
+        db.rollback()
+        return {"rows_processed": 0, "rows_inserted": 0, "last_id": current, "conflict": True}
+    last_id = int(df['id'].max())
+    try:
+        result = etl.process_data(df.drop(columns='id'), db, commit=False)
+        oltp_crud.mark_loaded(db, df)
+        _set_watermark(db, max(current, last_id))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if result["rows_inserted"]:
+        etl.facts_committed(db, df['sale_id'])
+    return {"rows_processed": result["rows_processed"], "rows_inserted": result["rows_inserted"],
+            "last_id": last_id}
+
+
+def sync(db: Session, batch_size: int = None, max_batches: int = None, full: bool = False,
+         max_retries: int = None):
+    """Sync batch after batch until no untransferred rows remain past the watermark.
+
+    full=True starts from id 0 instead of the watermark; the transferred
+    flag keeps already moved rows from being loaded twice. A batch lost
+    to a watermark conflict is retried, up to max_retries times per run.
+    """
+    max_retries = OLTP_SYNC_MAX_RETRIES if max_retries is None else max_retries
+    totals = {"message": "Success", "batches": 0, "retries": 0, "rows_processed": 0, "rows_inserted": 0}
+    after_id = 0 if full else None
+    started = time.perf_counter()
+    while max_batches is None or totals["batches"] < max_batches:
+        batch = sync_batch(db, batch_size, after_id)
+        if batch is None:
+            break
+        if batch.get("conflict"):
+            if totals["retries"] >= max_retries:
+                totals["message"] = f"Stopped after {max_retries} watermark conflicts"
+                break
+            totals["retries"] += 1
+            continue
+        totals["batches"] += 1
+        totals["rows_processed"] += batch["rows_processed"]
+        totals["rows_inserted"] += batch["rows_inserted"]
+        if after_id is not None:
+            after_id = batch["last_id"]
+    seconds = time.perf_counter() - started
+    totals["rows_per_sec"] = totals["rows_inserted"] / seconds if seconds > 0 else 0.0
+    totals["watermark"] = watermark(db)
+    db.commit()
+    return totals
+
+
+class SyncScheduler:
+    """Runs sync() every interval seconds on a background thread."""
+
+    def __init__(self, interval: float = OLTP_SYNC_INTERVAL, batch_size: int = None):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.runs = 0
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.interval <= 0 or self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="oltp-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self):
+        full = OLTP_SYNC_FULL_EVERY > 0 and self.runs % OLTP_SYNC_FULL_EVERY == OLTP_SYNC_FULL_EVERY - 1
+        with EtlSessionLocal() as db:
+            try:
+                self.last_result = sync(db, self.batch_size, full=full)
+                self.last_error = None
+            except Exception as e:
+                logger.exception("Scheduled OLTP sync failed")
+                self.last_error = str(e)
+        self.runs += 1
+        self.last_run = time.time()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def status(self):
+        return {
+            "interval": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+scheduler = SyncScheduler()
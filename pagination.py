@@ -0,0 +1,95 @@
+import base64
+import json
+
+# Response headers carrying the cursors of the neighbouring pages
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+PREV_CURSOR_HEADER = "X-Prev-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key) -> str:
+    raw = json.dumps({"k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """The integer key a cursor points past; InvalidCursor for anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)["k"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    # Pages are keyed on integer ids; bool is an int subclass but never a key
+    if not isinstance(key, int) or isinstance(key, bool):
+        raise InvalidCursor("Invalid cursor")
+    return key
+
+
+class Page:
+    def __init__(self, items, next_cursor: str = None, prev_cursor: str = None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def headers(self):
+        headers = {}
+        if self.next_cursor:
+            headers[NEXT_CURSOR_HEADER] = self.next_cursor
+        if self.prev_cursor:
+            headers[PREV_CURSOR_HEADER] = self.prev_cursor
+        return headers
+
+
+def seek(query, column, limit: int, after: str = None, before: str = None,
+         descending: bool = False, skip: int = 0):
+    """One page of query ordered by a unique column, starting at a cursor.
+
+    With after/before the page is found by a range condition on the
+    column's index instead of OFFSET, so every page costs the same no
+    matter how deep it is. skip is only honoured without a cursor.
+    """
+    query = seek_query(query, column, limit, after, before, descending, skip)
+    return seek_page(query.all(), column, limit, after, before, skip)
+
+
+def seek_query(query, column, limit: int, after: str = None, before: str = None,
+               descending: bool = False, skip: int = 0):
+    """The ORM query or select() that fetches one page (plus one row) for seek()."""
+    if after and before:
+        raise InvalidCursor("Use either after or before, not both")
+    forward = column.desc() if descending else column.asc()
+    backward = column.asc() if descending else column.desc()
+
+    if before:
+        key = decode_cursor(before)
+        query = query.filter(column > key if descending else column < key)
+        return query.order_by(backward).limit(limit + 1)
+    query = query.order_by(forward)
+    if after:
+        key = decode_cursor(after)
+        query = query.filter(column < key if descending else column > key)
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit + 1)
+
+
+def seek_page(rows, column, limit: int, after: str = None, before: str = None, skip: int = 0):
+    """A Page from the rows fetched by seek_query()."""
+    if before:
+        more = len(rows) > limit
+        items = list(reversed(rows[:limit]))
+        prev_key = getattr(items[0], column.key) if items and more else None
+        next_key = getattr(items[-1], column.key) if items else None
+    else:
+        items = rows[:limit]
+        next_key = getattr(items[-1], column.key) if len(rows) > limit else None
+        prev_key = getattr(items[0], column.key) if items and (after or skip) else None
+
+    return Page(
+        items,
+        next_cursor=encode_cursor(next_key) if next_key is not None else None,
+        prev_cursor=encode_cursor(prev_key) if prev_key is not None else None,
+    )
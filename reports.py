@@ -0,0 +1,270 @@
+import asyncio
+from datetime import date, timedelta
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import cube
+from models import FactSales, DimDate, DimProduct, DimRegion, DimManager, DimSupplier, DimCategory, AggSalesMonthly
+
+
+class Source:
+    """A table aggregate reports can be answered from.
+
+    joins: dimension table -> (model, join condition), in join order
+    dimensions: group-by name -> (column, table it lives in or None)
+    filters: filter parameter -> (condition builder, table it needs or None)
+    measures: additive measure -> aggregate expression builder
+    """
+
+    def __init__(self, name, table, joins, dimensions, filters, measures, join_requires=None):
+        self.name = name
+        self.table = table
+        self.joins = joins
+        self.dimensions = dimensions
+        self.filters = filters
+        self.measures = measures
+        self.join_requires = join_requires or {}
+
+    def supports(self, dimensions, filters):
+        return (all(d in self.dimensions for d in dimensions)
+                and all(f in self.filters and self.filters[f][2](v) for f, v in filters.items()))
+
+
+def _any(value):
+    return True
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _month_start(value):
+    d = _parse_date(value)
+    return d is not None and d.day == 1
+
+
+def _month_end(value):
+    d = _parse_date(value)
+    return d is not None and (d + timedelta(days=1)).day == 1
+
+
+def _month_key(value):
+    d = _parse_date(value)
+    return d.year * 100 + d.month
+
+
+FACTS = Source(
+    "fact_sales",
+    FactSales,
+    joins={
+        "date": (DimDate, FactSales.date_id == DimDate.id),
+        "product": (DimProduct, FactSales.product_id == DimProduct.id),
+        "region": (DimRegion, FactSales.region_id == DimRegion.id),
+        "manager": (DimManager, FactSales.manager_id == DimManager.id),
+        "supplier": (DimSupplier, FactSales.supplier_id == DimSupplier.id),
+        # Category hangs off product, so it always comes after it
+        "category": (DimCategory, DimProduct.category_id == DimCategory.id),
+    },
+    join_requires={"category": "product"},
+    dimensions={
+        "region": (DimRegion.region_name, "region"),
+        "manager": (DimManager.name, "manager"),
+        "category": (DimCategory.name, "category"),
+        "product": (DimProduct.name, "product"),
+        "supplier": (DimSupplier.name, "supplier"),
+        "year": (DimDate.year, "date"),
+        "quarter": (DimDate.quarter, "date"),
+        "month": (DimDate.month_name, "date"),
+    },
+    filters={
+        "region": (lambda v: DimRegion.region_name == v, "region", _any),
+        "manager": (lambda v: DimManager.name == v, "manager", _any),
+        "category": (lambda v: DimCategory.name == v, "category", _any),
+        "supplier": (lambda v: DimSupplier.name == v, "supplier", _any),
+        "product": (lambda v: DimProduct.name == v, "product", _any),
+        "date_from": (lambda v: DimDate.date >= v, "date", _any),
+        "date_to": (lambda v: DimDate.date <= v, "date", _any),
+    },
+    measures={
+        "revenue": lambda: func.sum(FactSales.revenue),
+        "quantity": lambda: func.sum(FactSales.quantity),
+        "count": lambda: func.count(FactSales.id),
+        "discount": lambda: func.sum(FactSales.discount),
+        "unit_price": lambda: func.sum(FactSales.unit_price),
+    },
+)
+
+# The monthly rollup answers anything grouped and filtered by month or
+# coarser and by region / category / manager / supplier; date filters
+# qualify only when they fall on month boundaries.
+ROLLUP = Source(
+    "agg_sales_monthly",
+    AggSalesMonthly,
+    joins={
+        "region": (DimRegion, AggSalesMonthly.region_id == DimRegion.id),
+        "manager": (DimManager, AggSalesMonthly.manager_id == DimManager.id),
+        "supplier": (DimSupplier, AggSalesMonthly.supplier_id == DimSupplier.id),
+        "category": (DimCategory, AggSalesMonthly.category_id == DimCategory.id),
+    },
+    dimensions={
+        "region": (DimRegion.region_name, "region"),
+        "manager": (DimManager.name, "manager"),
+        "category": (DimCategory.name, "category"),
+        "supplier": (DimSupplier.name, "supplier"),
+        "year": (AggSalesMonthly.year, None),
+        "quarter": (AggSalesMonthly.quarter, None),
+        "month": (AggSalesMonthly.month_name, None),
+    },
+    filters={
+        "region": (lambda v: DimRegion.region_name == v, "region", _any),
+        "manager": (lambda v: DimManager.name == v, "manager", _any),
+        "category": (lambda v: DimCategory.name == v, "category", _any),
+        "supplier": (lambda v: DimSupplier.name == v, "supplier", _any),
+        "date_from": (lambda v: AggSalesMonthly.year * 100 + AggSalesMonthly.month >= _month_key(v),
+                      None, _month_start),
+        "date_to": (lambda v: AggSalesMonthly.year * 100 + AggSalesMonthly.month <= _month_key(v),
+                    None, _month_end),
+    },
+    measures={
+        "revenue": lambda: func.sum(AggSalesMonthly.revenue),
+        "quantity": lambda: func.sum(AggSalesMonthly.quantity),
+        "count": lambda: func.sum(AggSalesMonthly.sale_count),
+        "discount": lambda: func.sum(AggSalesMonthly.discount),
+        "unit_price": lambda: func.sum(AggSalesMonthly.unit_price),
+    },
+)
+
+# Smallest first; the first source that can answer a report is used
+SOURCES = [ROLLUP, FACTS]
+
+# Kept for callers that only need the fact-level definitions
+JOINS = FACTS.joins
+DIMENSIONS = FACTS.dimensions
+FILTERS = FACTS.filters
+MEASURES = FACTS.measures
+
+
+# Engines /reports/aggregate can run on
+ENGINES = ("sql", "cube")
+
+
+def _ratio(num, den):
+    return num / den if den else 0
+
+
+# Metric -> (measures it needs, how to compute it from them)
+METRICS = {
+    "revenue": (("revenue",), lambda m: m["revenue"]),
+    "quantity": (("quantity",), lambda m: m["quantity"]),
+    "count": (("count",), lambda m: m["count"]),
+    "discount": (("discount",), lambda m: m["discount"]),
+    "avg_check": (("revenue", "count"), lambda m: _ratio(m["revenue"], m["count"])),
+    "avg_unit_price": (("unit_price", "count"), lambda m: _ratio(m["unit_price"], m["count"])),
+}
+
+
+def parse_metrics(metric: str):
+    """Comma-separated metric names, validated and de-duplicated in order."""
+    names = []
+    for name in (metric or "revenue").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in METRICS:
+            raise ValueError(f"Invalid metric: {name}")
+        if name not in names:
+            names.append(name)
+    return names or ["revenue"]
+
+
+def choose_source(dimensions, filters):
+    for source in SOURCES:
+        if source.supports(dimensions, filters):
+            return source
+    return FACTS
+
+
+class AggregatePlan:
+    """A grouped aggregate joining only the tables it uses.
+
+    Answered from the smallest source (rollup or fact_sales) that has every
+    group-by column and filter the report asks for.
+    """
+
+    def __init__(self, dimensions, metrics, filters=None, source=None):
+        for dim in dimensions:
+            if dim not in FACTS.dimensions:
+                raise ValueError("Invalid dimension")
+        self.dimensions = list(dimensions)
+        self.metrics = list(metrics)
+        self.filters = {k: v for k, v in (filters or {}).items() if v}
+        self.source = source or choose_source(self.dimensions, self.filters)
+        self.measures = [m for m in self.source.measures if any(m in METRICS[name][0] for name in self.metrics)]
+
+        tables = [self.source.dimensions[d][1] for d in self.dimensions]
+        tables += [self.source.filters[f][1] for f in self.filters]
+        needed = {t for t in tables if t}
+        for table in list(needed):
+            if table in self.source.join_requires:
+                needed.add(self.source.join_requires[table])
+        self.joins = [t for t in self.source.joins if t in needed]
+
+    def statement(self):
+        source = self.source
+        group_cols = [source.dimensions[d][0] for d in self.dimensions]
+        labeled = [col.label(f"d{i + 1}") for i, col in enumerate(group_cols)]
+        measure_cols = [source.measures[m]().label(m) for m in self.measures]
+        stmt = select(*labeled, *measure_cols).select_from(source.table)
+        for table in self.joins:
+            model, onclause = source.joins[table]
+            stmt = stmt.join(model, onclause)
+        for name, value in self.filters.items():
+            stmt = stmt.where(source.filters[name][0](value))
+        return stmt.group_by(*group_cols)
+
+    def format(self, rows):
+        """Result rows as report dicts: d1, d2, ..., one key per metric, and value."""
+        results = []
+        for row in rows:
+            # SQL rows or plain dicts (from the in-memory cube)
+            mapping = getattr(row, "_mapping", row)
+            measures = {m: mapping[m] or 0 for m in self.measures}
+            item = {f"d{i + 1}": mapping[f"d{i + 1}"] for i in range(len(self.dimensions))}
+            for name in self.metrics:
+                item[name] = float(METRICS[name][1](measures))
+            item["value"] = item[self.metrics[0]]
+            results.append(item)
+        return results
+
+
+def aggregate_report(db: Session, dimensions, metric: str = "revenue", source: Source = None,
+                     engine: str = "sql", **filters):
+    """engine="cube" answers from the in-memory cube instead of SQL."""
+    if engine not in ENGINES:
+        raise ValueError(f"Invalid engine: {engine}")
+    if engine == "cube":
+        plan = AggregatePlan(dimensions, parse_metrics(metric), filters, FACTS)
+        if cube.supports(plan.filters):
+            return plan.format(cube.cube.execute(db, plan))
+    plan = AggregatePlan(dimensions, parse_metrics(metric), filters, source)
+    return plan.format(db.execute(plan.statement()).all())
+
+
+async def aggregate_report_async(db: AsyncSession, dimensions, metric: str = "revenue", source: Source = None,
+                                 engine: str = "sql", **filters):
+    """aggregate_report on an async session; the SQL plan's statement is awaited directly."""
+    if engine not in ENGINES:
+        raise ValueError(f"Invalid engine: {engine}")
+    if engine == "cube":
+        plan = AggregatePlan(dimensions, parse_metrics(metric), filters, FACTS)
+        if cube.supports(plan.filters):
+            snapshot = await db.run_sync(cube.cube.load, plan)
+            # The NumPy work would block the event loop; only the reads use the session
+            return plan.format(await asyncio.to_thread(cube.cube.compute, snapshot, plan))
+    plan = AggregatePlan(dimensions, parse_metrics(metric), filters, source)
+    return plan.format((await db.execute(plan.statement())).all())
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import database
+
+# "memory" keeps results per process; "sqlite" shares them between worker
+# processes on one host, standing in for a shared cache such as Redis
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "60"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2048"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(tempfile.gettempdir(), "sales_analytics_cache.db"))
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL and a byte budget."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._bumped_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: bytes, ttl: float):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, payload)
+            self._bytes += len(payload)
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def generation(self):
+        return self._generation
+
+    def bumped_at(self):
+        return self._bumped_at
+
+    def bump_generation(self):
+        with self._lock:
+            self._generation += 1
+            self._bumped_at = time.time()
+            # Entries of older generations can never be hit again
+            self._entries.clear()
+            self._bytes = 0
+            return self._generation
+
+    def usage(self):
+        return {"entries": len(self._entries), "bytes_used": self._bytes}
+
+
+class SqliteBackend:
+    """Cache shared by every process that opens the same SQLite file."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, "
+                         "size INTEGER, expires_at REAL, last_used REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('generation', 0)")
+            conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('bumped_at', 0)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def set(self, key: str, payload: bytes, ttl: float):
+        if len(payload) > self.max_bytes:
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO entries (key, value, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                     (key, payload, len(payload), now + ttl, now))
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        entries, used = conn.execute("SELECT count(*), coalesce(sum(size), 0) FROM entries").fetchone()
+        while entries > self.max_entries or used > self.max_bytes:
+            oldest = conn.execute("SELECT key, size FROM entries ORDER BY last_used LIMIT 1").fetchone()
+            if oldest is None:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (oldest[0],))
+            entries, used = entries - 1, used - oldest[1]
+
+    def generation(self):
+        return self._conn().execute("SELECT value FROM counters WHERE name = 'generation'").fetchone()[0]
+
+    def bumped_at(self):
+        return self._conn().execute("SELECT value FROM counters WHERE name = 'bumped_at'").fetchone()[0]
+
+    def bump_generation(self):
+        conn = self._conn()
+        conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'generation'")
+        conn.execute("UPDATE counters SET value = ? WHERE name = 'bumped_at'", (time.time(),))
+        conn.execute("DELETE FROM entries")
+        return self.generation()
+
+    def usage(self):
+        entries, used = self._conn().execute("SELECT count(*), coalesce(sum(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes_used": used}
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "sqlite": SqliteBackend,
+}
+
+
+class ResultCache:
+    """Caches analytics responses keyed on endpoint, normalized parameters
+    and the warehouse generation.
+
+    Every fact or dimension write calls bump_generation(), so a cached
+    result is never served after the data behind it changed (within one
+    process for the memory backend, across processes for sqlite). Results
+    read from a replica are not cached until READ_YOUR_WRITES_SECONDS after
+    the last bump, since the replica may not have the write yet.
+    """
+
+    def __init__(self, backend=None, ttl: float = RESULT_CACHE_TTL):
+        self.backend = backend or BACKENDS[RESULT_CACHE_BACKEND]()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(params):
+        normalized = {}
+        for name, value in params.items():
+            if value is None or value == "":
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            elif isinstance(value, (list, tuple)):
+                value = list(value)
+            normalized[name] = value
+        return normalized
+
+    def key(self, endpoint: str, params, generation: int):
+        raw = json.dumps([endpoint, self.normalize(params), generation], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get_or_compute(self, endpoint: str, params, compute, replica: bool = False):
+        """Cached result, or compute()'s; replica=True when compute reads the replica."""
+        key, hit, result = self._lookup(endpoint, params)
+        if hit:
+            return result
+        result = compute()
+        self._store(key, result, replica)
+        return result
+
+    async def get_or_compute_async(self, endpoint: str, params, compute, replica: bool = False):
+        """get_or_compute where compute is a coroutine function."""
+        key, hit, result = self._lookup(endpoint, params)
+        if hit:
+            return result
+        result = await compute()
+        self._store(key, result, replica)
+        return result
+
+    def replica_lagging(self):
+        """Whether a replica may still be missing the last write."""
+        window = database.READ_YOUR_WRITES_SECONDS
+        return window > 0 and time.time() - self.backend.bumped_at() < window
+
+    def _store(self, key: str, result, replica: bool):
+        if replica and self.replica_lagging():
+            return
+        self.backend.set(key, pickle.dumps(result), self.ttl)
+
+    def _lookup(self, endpoint: str, params):
+        key = self.key(endpoint, params, self.backend.generation())
+        payload = self.backend.get(key)
+        if payload is not None:
+            self.hits += 1
+            return key, True, pickle.loads(payload)
+        self.misses += 1
+        return key, False, None
+
+    def bump_generation(self):
+        return self.backend.bump_generation()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "generation": self.backend.generation(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "ttl": self.ttl,
+            "max_bytes": self.backend.max_bytes,
+            **self.backend.usage(),
+        }
+
+
+cache = ResultCache()
+
+
+def invalidate():
+    """Called after every write to fact or dimension tables."""
+    cache.bump_generation()
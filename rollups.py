@@ -0,0 +1,246 @@
+import pandas as pd
+from sqlalchemy import select, insert, update, delete, func, and_, or_, bindparam, text
+from sqlalchemy.orm import Session
+
+import dim_cache
+import fact_writer
+import result_cache
+from models import AggSalesMonthly, SalesTotals, FactSales, DimDate, DimProduct
+
+# Columns that identify one rollup row
+GRAIN = ["year", "month", "region_id", "category_id", "manager_id", "supplier_id"]
+# Additive measures stored per rollup row
+MEASURES = ["revenue", "quantity", "discount", "unit_price", "sale_count"]
+# Stand-in category_id for products without a category
+NO_CATEGORY = 0
+# Primary key of the single sales_totals row
+TOTALS_ID = 1
+MONEY = ("revenue", "discount", "unit_price")
+
+# Every column a rollup row is written with
+ROW_COLUMNS = ["year", "quarter", "month", "month_name"] + GRAIN[2:] + MEASURES
+
+MONTH_NAMES = {m: pd.Timestamp(2000, m, 1).strftime("%B") for m in range(1, 13)}
+
+
+def _lookup(db: Session, dim: str, column: str, keys):
+    """id -> column map from the dimension cache, reloaded once if keys are missing."""
+    values = dim_cache.cache.names(db, dim, column)
+    if any(k not in values for k in pd.unique(keys)):
+        dim_cache.cache.invalidate()
+        values = dim_cache.cache.names(db, dim, column)
+    return values
+
+
+def fact_deltas(db: Session, facts: pd.DataFrame, sign: int = 1) -> pd.DataFrame:
+    """Group fact rows (fact_sales columns) into signed rollup deltas."""
+    if not len(facts):
+        return pd.DataFrame(columns=GRAIN + MEASURES)
+    date_ids = facts["date_id"].astype("int64")
+    product_ids = facts["product_id"].astype("int64")
+    frame = pd.DataFrame({
+        "year": date_ids.map(_lookup(db, "date", "year", date_ids)),
+        "month": date_ids.map(_lookup(db, "date", "month", date_ids)),
+        "region_id": facts["region_id"].astype("int64"),
+        "category_id": product_ids.map(_lookup(db, "product", "category_id", product_ids)),
+        "manager_id": facts["manager_id"].astype("int64"),
+        "supplier_id": facts["supplier_id"].astype("int64"),
+        "revenue": facts["revenue"].astype(float),
+        "quantity": facts["quantity"].astype("int64"),
+        "discount": facts["discount"].fillna(0).astype(float),
+        "unit_price": facts["unit_price"].astype(float),
+    })
+    frame["category_id"] = frame["category_id"].fillna(NO_CATEGORY).astype("int64")
+    frame = frame.dropna(subset=["year", "month"])
+    frame["year"] = frame["year"].astype("int64")
+    frame["month"] = frame["month"].astype("int64")
+
+    deltas = frame.groupby(GRAIN, as_index=False).agg(
+        revenue=("revenue", "sum"),
+        quantity=("quantity", "sum"),
+        discount=("discount", "sum"),
+        unit_price=("unit_price", "sum"),
+        sale_count=("revenue", "size"),
+    )
+    for col in MONEY:
+        deltas[col] = (deltas[col] * sign).round(2)
+    for col in ("quantity", "sale_count"):
+        deltas[col] = deltas[col] * sign
+    return deltas
+
+
+def _rows(deltas: pd.DataFrame):
+    rows = deltas.astype(object).to_dict("records")
+    for row in rows:
+        row["quarter"] = (row["month"] - 1) // 3 + 1
+        row["month_name"] = MONTH_NAMES[row["month"]]
+    return rows
+
+
+def _upsert_on_conflict(db: Session, rows, dialect: str):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = AggSalesMonthly.__table__
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=GRAIN,
+        set_={m: table.c[m] + stmt.excluded[m] for m in MEASURES},
+    )
+    db.execute(stmt, rows)
+
+
+def _upsert_merge(db: Session, rows):
+    """SQL Server: MERGE ... WITH (HOLDLOCK) in batches of rows.
+
+    HOLDLOCK takes key-range locks on the grain, so concurrent writers of
+    the same grain row (parallel ETL partitions, jobs) queue instead of
+    both inserting it or losing one's delta.
+    """
+    table = AggSalesMonthly.__tablename__
+    per_statement = max(1, (fact_writer.MAX_BIND_PARAMS["mssql"] - 1) // len(ROW_COLUMNS))
+    columns = ", ".join(ROW_COLUMNS)
+    for start in range(0, len(rows), per_statement):
+        batch = rows[start:start + per_statement]
+        values = ", ".join(
+            "(" + ", ".join(f":{c}_{i}" for c in ROW_COLUMNS) + ")" for i in range(len(batch))
+        )
+        stmt = text(
+            f"MERGE {table} WITH (HOLDLOCK) AS t USING (VALUES {values}) AS s ({columns}) "
+            f"ON {' AND '.join(f't.{g} = s.{g}' for g in GRAIN)} "
+            f"WHEN MATCHED THEN UPDATE SET {', '.join(f't.{m} = t.{m} + s.{m}' for m in MEASURES)} "
+            f"WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({', '.join(f's.{c}' for c in ROW_COLUMNS)});"
+        )
+        db.execute(stmt, {f"{c}_{i}": row[c] for i, row in enumerate(batch) for c in ROW_COLUMNS})
+
+
+def _upsert_portable(db: Session, rows):
+    """Update existing grain rows and insert the rest, one statement each.
+
+    Nothing locks grain rows that do not exist yet, so this assumes a
+    single writer; dialects with an atomic upsert use one of the above.
+    """
+    table = AggSalesMonthly.__table__
+    months = {(r["year"], r["month"]) for r in rows}
+    existing = {
+        tuple(r[:-1]): r[-1]
+        for r in db.execute(
+            select(*[table.c[g] for g in GRAIN], table.c.id)
+            .where(or_(*[and_(table.c.year == y, table.c.month == m) for y, m in months]))
+        ).all()
+    }
+    updates, inserts = [], []
+    for row in rows:
+        row_id = existing.get(tuple(row[g] for g in GRAIN))
+        if row_id is None:
+            inserts.append(row)
+        else:
+            updates.append({"row_id": row_id, **{f"d_{m}": row[m] for m in MEASURES}})
+    if updates:
+        db.execute(
+            update(table).where(table.c.id == bindparam("row_id"))
+            .values({m: table.c[m] + bindparam(f"d_{m}") for m in MEASURES}),
+            updates,
+        )
+    if inserts:
+        db.execute(insert(table), inserts)
+
+
+def apply_deltas(db: Session, deltas: pd.DataFrame):
+    """Add signed deltas to the rollup inside the caller's transaction."""
+    if not len(deltas):
+        return
+    rows = _rows(deltas)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        _upsert_on_conflict(db, rows, dialect)
+    elif dialect == "mssql":
+        _upsert_merge(db, rows)
+    else:
+        _upsert_portable(db, rows)
+    if (deltas["sale_count"] < 0).any():
+        db.execute(delete(AggSalesMonthly).where(AggSalesMonthly.sale_count <= 0))
+    _apply_totals(db, deltas)
+
+
+def _apply_totals(db: Session, deltas: pd.DataFrame):
+    table = SalesTotals.__table__
+    values = {m: round(float(deltas[m].sum()), 2) if m in MONEY else int(deltas[m].sum()) for m in MEASURES}
+    updated = db.execute(
+        update(table).where(table.c.id == TOTALS_ID).values({m: table.c[m] + values[m] for m in MEASURES})
+    )
+    if updated.rowcount == 0:
+        # First write since the table was created: start from the rollup
+        refresh_totals(db)
+
+
+def refresh_totals(db: Session):
+    """Recompute the running totals row from the monthly rollup."""
+    table = SalesTotals.__table__
+    agg = AggSalesMonthly.__table__
+    sums = db.execute(select(*[func.coalesce(func.sum(agg.c[m]), 0) for m in MEASURES])).one()
+    db.execute(delete(table))
+    db.execute(insert(table).values(id=TOTALS_ID, **dict(zip(MEASURES, sums))))
+
+
+def apply_facts(db: Session, facts: pd.DataFrame, sign: int = 1):
+    """Fold newly inserted (sign=1) or removed (sign=-1) fact rows into the rollup."""
+    apply_deltas(db, fact_deltas(db, facts, sign))
+
+
+def sales_frame(sales):
+    """fact_sales rows as a frame from ORM FactSales objects."""
+    return pd.DataFrame([{
+        "date_id": s.date_id,
+        "product_id": s.product_id,
+        "manager_id": s.manager_id,
+        "supplier_id": s.supplier_id,
+        "region_id": s.region_id,
+        "quantity": s.quantity,
+        "unit_price": float(s.unit_price),
+        "discount": float(s.discount or 0),
+        "revenue": float(s.revenue),
+    } for s in sales])
+
+
+def rebuild(db: Session):
+    """Recompute the rollup from fact_sales in one INSERT ... SELECT."""
+    category = func.coalesce(DimProduct.category_id, NO_CATEGORY)
+    source = (
+        select(
+            DimDate.year, DimDate.quarter, DimDate.month, DimDate.month_name,
+            FactSales.region_id, category, FactSales.manager_id, FactSales.supplier_id,
+            func.sum(FactSales.revenue), func.sum(FactSales.quantity),
+            func.coalesce(func.sum(FactSales.discount), 0), func.sum(FactSales.unit_price),
+            func.count(FactSales.id),
+        )
+        .select_from(FactSales)
+        .join(DimDate, FactSales.date_id == DimDate.id)
+        .join(DimProduct, FactSales.product_id == DimProduct.id)
+        .group_by(
+            DimDate.year, DimDate.quarter, DimDate.month, DimDate.month_name,
+            FactSales.region_id, category, FactSales.manager_id, FactSales.supplier_id,
+        )
+    )
+    table = AggSalesMonthly.__table__
+    columns = ["year", "quarter", "month", "month_name", "region_id", "category_id",
+               "manager_id", "supplier_id"] + MEASURES
+    db.execute(delete(table))
+    db.execute(insert(table).from_select(columns, source))
+    refresh_totals(db)
+    db.commit()
+    result_cache.invalidate()
+
+
+def ensure_built(db: Session):
+    """Build the rollup if it is empty while fact_sales is not (e.g. after upgrading)."""
+    if db.execute(select(AggSalesMonthly.id).limit(1)).first() is not None:
+        if db.get(SalesTotals, TOTALS_ID) is None:
+            refresh_totals(db)
+            db.commit()
+        return False
+    if db.execute(select(FactSales.id).limit(1)).first() is None:
+        return False
+    rebuild(db)
+    return True
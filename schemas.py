@@ -42,6 +42,15 @@ class Sale(SaleBase):
     class Config:
         from_attributes = True
 
+class SaleWithNames(Sale):
+    """A sale with its dimension names inline (GET /sales?names=true)."""
+    product_name: str
+    category_name: Optional[str] = None
+    manager_name: str
+    supplier_name: str
+    region_name: str
+    city: str
+
 class SalesReport(BaseModel):
     total_revenue: float
     total_quantity: int
@@ -56,6 +65,23 @@ class ETLResult(BaseModel):
     message: str
     rows_processed: int
     rows_inserted: int
+    chunks: int = 1
+    rows_per_sec: Optional[float] = None
+
+class ETLJobStatus(BaseModel):
+    job_id: str
+    kind: str
+    source: Optional[str] = None
+    status: str
+    phase: str
+    rows_processed: int = 0
+    rows_inserted: int = 0
+    chunks: int = 0
+    rows_per_sec: float = 0
+    error: Optional[str] = None
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
 
 # OLTP
 class OltpSaleCreate(BaseModel):
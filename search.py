@@ -0,0 +1,104 @@
+import os
+import threading
+
+from sqlalchemy import select, func, or_, false
+from sqlalchemy.orm import Session
+
+import dim_cache
+from models import FactSales, DimProduct, DimManager, DimRegion
+
+# Above this many matching dimension ids the IN filter stops paying off
+# and the search falls back to ILIKE over the joined dimensions
+SEARCH_MAX_IDS = int(os.getenv("SEARCH_MAX_IDS", "1000"))
+
+# Dimension -> (fact column, searchable columns), mirroring the ILIKE search
+FIELDS = {
+    "product": (FactSales.product_id, ("name",)),
+    "manager": (FactSales.manager_id, ("name",)),
+    "region": (FactSales.region_id, ("region_name", "city")),
+}
+MODELS = {"product": DimProduct, "manager": DimManager, "region": DimRegion}
+
+
+def trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Trigram -> dimension ids for one dimension's searchable text."""
+
+    def __init__(self, rows, columns):
+        self.texts = {}
+        self.postings = {}
+        for row in rows:
+            values = [str(row[c]).casefold() for c in columns if row[c] is not None]
+            self.texts[row["id"]] = values
+            for value in values:
+                for gram in trigrams(value):
+                    self.postings.setdefault(gram, set()).add(row["id"])
+        self.max_id = max(self.texts, default=0)
+
+    def match(self, term: str):
+        """Ids whose text contains term (case-insensitive)."""
+        grams = trigrams(term)
+        if grams:
+            candidates = set.intersection(*(self.postings.get(g, set()) for g in grams))
+        else:
+            candidates = self.texts
+        return {i for i in candidates if any(term in value for value in self.texts[i])}
+
+
+class SalesSearch:
+    """Turns the /sales search term into IN filters on fact foreign keys.
+
+    Matching happens against small in-memory trigram indexes of product,
+    manager and region names, so the fact table is filtered by indexed id
+    columns instead of ILIKE over three joined tables.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _index(self, db: Session, dim: str, max_id: int) -> TrigramIndex:
+        version = dim_cache.cache.version
+        cached = self._indexes.get(dim)
+        if cached and cached[0] == version and cached[1].max_id >= max_id:
+            return cached[1]
+        # Built without the lock: rows() may query, and two builds of the
+        # same index are cheaper than readers queueing behind one
+        index = TrigramIndex(dim_cache.cache.rows(db, dim), FIELDS[dim][1])
+        if index.max_id < max_id:
+            # Members added by another process since the cache was loaded
+            dim_cache.cache.invalidate()
+            version = dim_cache.cache.version
+            index = TrigramIndex(dim_cache.cache.rows(db, dim), FIELDS[dim][1])
+        with self._lock:
+            self._indexes[dim] = (version, index)
+        return index
+
+    def match(self, db: Session, term: str):
+        """Dimension -> matching ids, or None when the term needs SQL LIKE semantics."""
+        if "%" in term or "_" in term or "\\" in term:
+            return None
+        term = term.casefold()
+        max_ids = db.execute(select(*[
+            select(func.max(MODELS[dim].id)).scalar_subquery() for dim in FIELDS
+        ])).one()
+        return {dim: self._index(db, dim, max_id or 0).match(term) for dim, max_id in zip(FIELDS, max_ids)}
+
+    def filter(self, db: Session, query, term: str):
+        """query filtered to sales matching term, or None to fall back to ILIKE."""
+        condition = self.condition(self.match(db, term))
+        return query.filter(condition) if condition is not None else None
+
+    @staticmethod
+    def condition(matches):
+        """WHERE clause on fact foreign keys for match() results, or None for ILIKE."""
+        if matches is None or sum(len(ids) for ids in matches.values()) > SEARCH_MAX_IDS:
+            return None
+        conditions = [FIELDS[dim][0].in_(sorted(ids)) for dim, ids in matches.items() if ids]
+        return or_(*conditions) if conditions else false()
+
+
+search = SalesSearch()
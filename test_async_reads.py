@@ -0,0 +1,160 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import tempfile
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import cube
+import dashboard
+import dim_cache
+import etl
+import models
+import oltp_crud
+import reports
+from database import async_url
+from test_etl_pipeline import sample_df
+
+
+def file_databases():
+    """A sync and an async session factory on the same scratch SQLite file."""
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'async.db')}"
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    dim_cache.cache.invalidate()
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        etl.process_data(sample_df(), db)
+    async_engine = create_async_engine(async_url(url))
+    return Session, async_engine, async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def test_async_reads_match_sync():
+    print("Testing async read paths...")
+    Session, async_engine, AsyncSession = file_databases()
+
+    async def run():
+        async with AsyncSession() as adb:
+            with Session() as db:
+                for search in (None, "Kyiv", "a_"):
+                    page = crud.get_sales_page(db, limit=25, search=search, names=True)
+                    async_page = await crud.get_sales_page_async(adb, limit=25, search=search, names=True)
+                    assert [s.id for s in async_page.items] == [s.id for s in page.items]
+                    assert [s.product_name for s in async_page.items] == [s.product_name for s in page.items]
+                    assert async_page.next_cursor == page.next_cursor
+                    after = await crud.get_sales_page_async(adb, limit=25, search=search, after=page.next_cursor)
+                    assert [s.id for s in after.items] == \
+                        [s.id for s in crud.get_sales_page(db, limit=25, search=search, after=page.next_cursor).items]
+                    assert await crud.count_sales_async(adb, search, exact=True) == \
+                        crud.count_sales(db, search, exact=True)
+
+                for engine in reports.ENGINES:
+                    assert await reports.aggregate_report_async(adb, ["region", "month"], "revenue,count",
+                                                                engine=engine, manager="Pavlo Boyko") == \
+                        reports.aggregate_report(db, ["region", "month"], "revenue,count",
+                                                 engine=engine, manager="Pavlo Boyko")
+                assert await crud.get_rankings_async(adb, "manager") == crud.get_rankings(db, "manager")
+                assert await crud.get_dims_async(adb, "region") == crud.get_dims(db, "region")
+                assert await dashboard.dashboard_metrics_async(adb, date_from="2024-01-01") == \
+                    dashboard.dashboard_metrics(db, date_from="2024-01-01")
+                assert await oltp_crud.count_oltp_sales_async(adb) == oltp_crud.count_oltp_sales(db)
+                assert (await oltp_crud.get_oltp_sales_page_async(adb)).items == []
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_concurrent_cache_loads_do_not_block():
+    Session, async_engine, AsyncSession = file_databases()
+
+    async def read(i):
+        async with AsyncSession() as adb:
+            if i % 4 == 0:
+                return await crud.get_rankings_async(adb, "product")
+            if i % 4 == 1:
+                return await crud.count_sales_async(adb, "Kyiv")
+            if i % 4 == 2:
+                return await reports.aggregate_report_async(adb, ["region", "month"], engine="cube")
+            return (await crud.get_sales_page_async(adb, limit=10, search="Pavlo")).items
+
+    async def run():
+        # Every read starts with cold caches, so they all try to load at once
+        dim_cache.cache.invalidate()
+        cube.cube.invalidate()
+        results = await asyncio.wait_for(asyncio.gather(*[read(i) for i in range(24)]), timeout=60)
+        await async_engine.dispose()
+        return results
+
+    results = asyncio.run(run())
+    assert all(r for r in results)
+
+
+def test_independent_cache_loads_overlap():
+    print("Testing that cold cache loads run concurrently...")
+    Session, async_engine, AsyncSession = file_databases()
+    load = dim_cache.cache._load
+    loading = []
+    overlap = []
+
+    def counting_load(db, dim):
+        loading.append(dim)
+        overlap.append(len(loading))
+        try:
+            return load(db, dim)
+        finally:
+            loading.remove(dim)
+
+    async def read(dim):
+        async with AsyncSession() as adb:
+            return await crud.get_dims_async(adb, dim)
+
+    async def run():
+        dim_cache.cache.invalidate()
+        results = await asyncio.wait_for(asyncio.gather(read("region"), read("manager")), timeout=60)
+        await async_engine.dispose()
+        return results
+
+    dim_cache.cache._load = counting_load
+    try:
+        regions, managers = asyncio.run(run())
+    finally:
+        del dim_cache.cache._load
+    assert regions and managers
+    # The second load started while the first one was still waiting on the database
+    assert max(overlap) == 2, overlap
+
+
+def test_cube_work_runs_off_the_event_loop():
+    Session, async_engine, AsyncSession = file_databases()
+    compute = cube.cube.compute
+    threads = []
+
+    def recording(snapshot, plan):
+        threads.append(threading.current_thread())
+        return compute(snapshot, plan)
+
+    async def run():
+        async with AsyncSession() as adb:
+            rows = await reports.aggregate_report_async(adb, ["region", "month"], engine="cube")
+        await async_engine.dispose()
+        return rows
+
+    cube.cube.compute = recording
+    try:
+        assert asyncio.run(run())
+    finally:
+        del cube.cube.compute
+    assert threads and threads[0] is not threading.main_thread()
+
+
+if __name__ == "__main__":
+    test_async_reads_match_sync()
+    test_concurrent_cache_loads_do_not_block()
+    test_independent_cache_loads_overlap()
+    test_cube_work_runs_off_the_event_loop()
@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func
+
+import counts
+import crud
+import etl
+import models
+import oltp_crud
+from test_etl_pipeline import make_session, sample_df
+
+
+def test_unfiltered_count_from_rollup():
+    print("Testing count strategies...")
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+    exact = db.query(func.count(models.FactSales.id)).scalar()
+    assert crud.count_sales(db) == {"count": exact, "approximate": False}
+    # Answered by the single running-totals row, not a sum over the rollup
+    db.query(models.SalesTotals).update({"sale_count": exact + 1})
+    assert crud.count_sales(db)["count"] == exact + 1
+    db.rollback()
+    assert oltp_crud.count_oltp_sales(db) == {"count": 0, "approximate": False}
+    db.close()
+
+
+def test_filtered_count_exact_then_estimated():
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+    total = db.query(func.count(models.FactSales.id)).scalar()
+
+    for term in ("a", "Kyiv"):
+        exact = crud.get_sales_count(db, search=term)
+        assert crud.count_sales(db, search=term) == {"count": exact, "approximate": False}
+        assert crud.count_sales(db, search=term, exact=True)["count"] == exact
+
+        query = crud._filter_sales(db, db.query(models.FactSales.id), term)
+        small = counts.filtered_count(db, query, models.FactSales.id, total, limit=exact - 1, sample_rows=total // 2)
+        assert small["approximate"]
+        assert exact * 0.5 <= small["count"] <= exact * 1.5, (term, exact, small)
+    db.close()
+
+
+if __name__ == "__main__":
+    test_unfiltered_count_from_rollup()
+    test_filtered_count_exact_then_estimated()
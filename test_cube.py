@@ -0,0 +1,120 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import time
+from datetime import date
+
+from sqlalchemy import delete, update
+
+import crud
+import cube
+import etl
+import models
+import reports
+import schemas
+from test_etl_pipeline import make_session, sample_df
+
+METRICS = "revenue,quantity,count,discount,avg_check,avg_unit_price"
+
+
+def report(db, dims, engine, **filters):
+    rows = reports.aggregate_report(db, dims, METRICS, source=reports.FACTS, engine=engine, **filters)
+    return {(r["d1"], r["d2"]): r for r in rows}
+
+
+def assert_engines_match(db, cases):
+    for dims, filters in cases:
+        expected = report(db, dims, "sql", **filters)
+        got = report(db, dims, "cube", **filters)
+        assert got == expected, (dims, filters)
+
+
+def test_cube_matches_sql():
+    print("Testing cube engine against SQL...")
+    engine, db = make_session()
+    cube.cube.invalidate()
+    df = sample_df()
+    etl.process_data(df.iloc[:600].copy(), db)
+
+    cases = [
+        (["year", "quarter"], {}),
+        (["region", "category"], {}),
+        (["manager", "month"], {"date_from": "2024-01-15", "date_to": "2024-06-10"}),
+        (["supplier", "product"], {"category": df['category'].iloc[0]}),
+        (["product", "region"], {"manager": "nobody"}),
+    ]
+    assert_engines_match(db, cases)
+    loaded = cube.cube.rows
+
+    # New facts are appended, not reloaded
+    etl.process_data(df.iloc[600:].copy(), db)
+    assert_engines_match(db, cases)
+    assert cube.cube.rows > loaded
+    assert cube.cube.max_id == cube.cube.columns["id"].max()
+
+    # Updates and deletes are picked up as well
+    sale = schemas.SaleCreate(
+        date=date(2024, 1, 1), product_id=1, manager_id=1, supplier_id=1, region_id=1,
+        quantity=3, unit_price=10.05, discount=0.3, payment_type="cash", sales_channel="online",
+    )
+    crud.create_sale(db, sale)
+    crud.update_sale(db, 5, sale.model_copy(update={"region_id": 2, "quantity": 7}))
+    crud.delete_sale(db, 9)
+    assert_engines_match(db, cases)
+    db.close()
+
+
+def test_cube_sees_other_processes_writes():
+    engine, db = make_session()
+    cube.cube.invalidate()
+    etl.process_data(sample_df().iloc[:300].copy(), db)
+    cases = [(["region", "month"], {})]
+    assert_engines_match(db, cases)
+
+    # Raw statements stand in for another process: no generation bump, no invalidate()
+    db.execute(delete(models.FactSales).where(models.FactSales.id.in_([2, 3])))
+    db.commit()
+    assert_engines_match(db, cases)
+
+    db.execute(update(models.FactSales).where(models.FactSales.id == 5).values(quantity=999))
+    db.commit()
+    saved = cube.cube.max_age
+    cube.cube.max_age = 0.01
+    try:
+        time.sleep(0.02)
+        assert_engines_match(db, cases)
+    finally:
+        cube.cube.max_age = saved
+    db.close()
+
+
+def test_cube_groups_many_dimensions():
+    engine, db = make_session()
+    cube.cube.invalidate()
+    etl.process_data(sample_df().iloc[:600].copy(), db)
+    # Only the combinations present are grouped, however large their product
+    dims = ["product", "manager", "supplier", "region"]
+    key = lambda r: tuple(r[f"d{i + 1}"] for i in range(len(dims)))
+    expected = sorted(reports.aggregate_report(db, dims, METRICS, source=reports.FACTS, engine="sql"), key=key)
+    got = sorted(reports.aggregate_report(db, dims, METRICS, source=reports.FACTS, engine="cube"), key=key)
+    assert got == expected
+    db.close()
+
+
+def test_unknown_engine_rejected():
+    engine, db = make_session()
+    try:
+        reports.aggregate_report(db, ["year", "quarter"], engine="gpu")
+    except ValueError as e:
+        assert "gpu" in str(e)
+    else:
+        raise AssertionError("unknown engine accepted")
+    db.close()
+
+
+if __name__ == "__main__":
+    test_cube_matches_sql()
+    test_cube_sees_other_processes_writes()
+    test_cube_groups_many_dimensions()
+    test_unknown_engine_rejected()
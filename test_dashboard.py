@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import date
+
+import crud
+import dashboard
+import etl
+import models
+import rollups
+import schemas
+from test_etl_pipeline import make_session, sample_df
+
+
+def fact_metrics(db, start=None, end=None, region=None):
+    q = db.query(models.FactSales).join(models.DimDate).join(models.DimRegion)
+    if start:
+        q = q.filter(models.DimDate.date >= start)
+    if end:
+        q = q.filter(models.DimDate.date <= end)
+    if region:
+        q = q.filter(models.DimRegion.region_name == region)
+    sales = q.all()
+    return dashboard._metrics(sum(float(s.revenue) for s in sales), sum(s.quantity for s in sales), len(sales))
+
+
+def assert_close(got, expected):
+    for key in dashboard.KEYS:
+        assert abs(got[key] - expected[key]) < 1e-6, (key, got[key], expected[key])
+
+
+def test_running_totals_follow_writes():
+    print("Testing dashboard running totals...")
+    engine, db = make_session()
+    df = sample_df()
+    etl.process_data(df.iloc[:700].copy(), db)
+    etl.process_data(df.iloc[700:].copy(), db)
+    sale = schemas.SaleCreate(
+        date=date(2024, 1, 1), product_id=1, manager_id=1, supplier_id=1, region_id=1,
+        quantity=3, unit_price=10, discount=1, payment_type="cash", sales_channel="online",
+    )
+    crud.create_sale(db, sale)
+    crud.update_sale(db, 5, sale.model_copy(update={"quantity": 7}))
+    crud.delete_sale(db, 9)
+
+    assert_close(dashboard.dashboard_metrics(db), fact_metrics(db))
+    incremental = db.get(models.SalesTotals, rollups.TOTALS_ID)
+    incremental = (float(incremental.revenue), incremental.quantity, incremental.sale_count)
+    rollups.rebuild(db)
+    rebuilt = db.get(models.SalesTotals, rollups.TOTALS_ID)
+    assert incremental == (float(rebuilt.revenue), rebuilt.quantity, rebuilt.sale_count)
+    db.close()
+
+
+def test_filtered_and_compared_periods():
+    engine, db = make_session()
+    df = sample_df()
+    etl.process_data(df, db)
+    region = df['region_name'].iloc[0]
+
+    cases = [
+        # Month-aligned periods are answered from the rollup, others from facts
+        ("2024-01-01", "2024-03-31", "2024-04-01", "2024-06-30"),
+        ("2024-01-10", "2024-02-20", "2023-12-10", "2024-01-20"),
+    ]
+    for start, end, prev_start, prev_end in cases:
+        got = dashboard.dashboard_metrics(db, start, end, prev_start, prev_end, region=region)
+        current = fact_metrics(db, start, end, region)
+        previous = fact_metrics(db, prev_start, prev_end, region)
+        assert_close(got, current)
+        assert_close(got["previous"], previous)
+        if previous["total_revenue"]:
+            expected = (current["total_revenue"] - previous["total_revenue"]) / previous["total_revenue"]
+            assert abs(got["change"]["total_revenue"] - expected) < 1e-9
+
+    assert_close(dashboard.dashboard_metrics(db, region=region), fact_metrics(db, region=region))
+    db.close()
+
+
+if __name__ == "__main__":
+    test_running_totals_follow_writes()
+    test_filtered_and_compared_periods()
@@ -0,0 +1,56 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, desc
+
+import crud
+import dim_cache
+import etl
+import models
+from test_etl_pipeline import make_session, sample_df
+
+
+def test_cache_hits_and_invalidation():
+    print("Testing dimension cache...")
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+    cache = dim_cache.DimensionCache()
+
+    managers = cache.key_map(db, "manager")
+    assert cache.stats()["misses"] == 1
+    assert cache.key_map(db, "manager") is managers
+    assert cache.stats()["hits"] == 1
+
+    regions = cache.rows(db, "region")
+    assert all(r["name"] == f"{r['region_name']} - {r['city']}" for r in regions)
+
+    version = cache.version
+    cache.invalidate()
+    assert cache.version == version + 1
+    cache.key_map(db, "manager")
+    assert cache.stats()["misses"] == 3
+    db.close()
+
+
+def test_rankings_match_joined_query():
+    print("Testing rankings against the joined query...")
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+
+    for entity, model, col, name_col in (
+        ("manager", models.DimManager, models.FactSales.manager_id, models.DimManager.name),
+        ("region", models.DimRegion, models.FactSales.region_id, models.DimRegion.region_name),
+        ("product", models.DimProduct, models.FactSales.product_id, models.DimProduct.name),
+    ):
+        expected = db.query(name_col, func.sum(models.FactSales.revenue).label("total")) \
+            .join(model, col == model.id).group_by(name_col).order_by(desc("total")).limit(5).all()
+        ranked = crud.get_rankings(db, entity, 5)
+        assert [r["name"] for r in ranked] == [e[0] for e in expected]
+        assert [r["revenue"] for r in ranked] == [float(e[1]) for e in expected]
+    db.close()
+
+
+if __name__ == "__main__":
+    test_cache_hits_and_invalidation()
+    test_rankings_match_joined_query()
@@ -0,0 +1,63 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import time
+import pandas as pd
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import etl_jobs
+import models
+import dim_cache
+
+
+def wait_for(job, timeout=30):
+    deadline = time.time() + timeout
+    while job.status in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.05)
+    return job
+
+
+def test_background_job_reports_progress():
+    print("Testing background ETL job runner...")
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    dim_cache.cache.invalidate()
+    etl_jobs.EtlSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_sales_diverse.csv")
+    runner = etl_jobs.ETLJobRunner(max_workers=1, max_pending=1)
+    job = runner.submit("load", lambda: pd.read_csv(path, chunksize=400), source=path)
+    assert runner.get(job.id) is job
+
+    wait_for(job)
+    status = job.to_dict()
+    print(f"Job status: {status}")
+    assert status["status"] == "succeeded"
+    assert status["phase"] == "finished"
+    assert status["chunks"] == 3
+    assert status["rows_processed"] == status["rows_inserted"] == 1200
+    assert status["rows_per_sec"] > 0
+
+    db = etl_jobs.EtlSessionLocal()
+    assert db.query(func.count(models.FactSales.id)).scalar() == 1200
+    db.close()
+
+
+def test_failed_job_keeps_error():
+    print("Testing failed ETL job...")
+    runner = etl_jobs.ETLJobRunner(max_workers=1, max_pending=0)
+
+    def broken():
+        raise ValueError("bad input")
+
+    job = wait_for(runner.submit("upload", broken))
+    assert job.status == "failed"
+    assert "bad input" in job.error
+
+
+if __name__ == "__main__":
+    test_background_job_reports_progress()
+    test_failed_job_keeps_error()
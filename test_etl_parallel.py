@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import pandas as pd
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import etl
+import etl_parallel
+import models
+import dim_cache
+
+
+def make_database():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    url = f"sqlite:///{path}"
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    dim_cache.cache.invalidate()
+    return url, engine
+
+
+def fact_rows(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(models.FactSales.sale_id, models.DimRegion.region_name, models.DimRegion.city,
+                   models.DimProduct.business_id, models.DimDate.date, models.FactSales.revenue)
+            .join(models.DimRegion).join(models.DimProduct).join(models.DimDate)
+            .order_by(models.FactSales.sale_id)
+        ).all()
+    return [tuple(r) for r in rows]
+
+
+def test_partitions_cover_every_row():
+    print("Testing CSV byte-range partitioning...")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_sales_diverse.csv")
+    header, ranges = etl_parallel.partition_csv(path, 7)
+    frames = [etl_parallel._read_partition(path, header, s, e) for s, e in ranges]
+    assert len(ranges) >= 7
+    assert sum(len(f) for f in frames) == len(pd.read_csv(path))
+
+
+def test_parallel_load_matches_serial():
+    print("Testing parallel ETL against the serial path...")
+    source = pd.read_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_sales_diverse.csv"))
+    # Repeat some sale_ids further down the file so partitions overlap
+    source = pd.concat([source, source.head(40)], ignore_index=True)
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    source.to_csv(path, index=False)
+
+    serial_url, serial_engine = make_database()
+    db = sessionmaker(bind=serial_engine)()
+    serial = etl.process_chunks(etl.read_chunks(path, 300), db)
+    db.close()
+
+    parallel_url, parallel_engine = make_database()
+    parallel = etl_parallel.load_data_parallel(path, workers=3, database_url=parallel_url)
+    print(f"Serial: {serial}\nParallel: {parallel}")
+
+    assert parallel["rows_processed"] == serial["rows_processed"] == len(source)
+    assert parallel["rows_inserted"] == serial["rows_inserted"] == 1200
+    assert fact_rows(parallel_engine) == fact_rows(serial_engine)
+
+
+if __name__ == "__main__":
+    test_partitions_cover_every_row()
+    test_parallel_load_matches_serial()
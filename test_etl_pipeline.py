@@ -0,0 +1,153 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import etl
+import fact_writer
+import models
+import dim_cache
+
+
+def make_session():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    dim_cache.cache.invalidate()
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def sample_df():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_sales_diverse.csv")
+    return pd.read_csv(path)
+
+
+def test_dimension_round_trips_are_constant():
+    print("Testing set-based dimension loading...")
+    engine, db = make_session()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    df = sample_df()
+    etl.load_dimensions(df, db)
+    first_load = len(statements)
+    print(f"Statements for first dimension load: {first_load}")
+    # six dimensions x (cache load, insert, re-select)
+    assert first_load <= 18
+
+    statements.clear()
+    etl.load_dimensions(df, db)
+    print(f"Statements with a warm dimension cache: {len(statements)}")
+    assert len(statements) == 6
+
+    statements.clear()
+    etl.load_dimensions(df, db)
+    assert len(statements) == 0
+
+    assert db.query(func.count(models.DimRegion.id)).scalar() == len(df[['region_name', 'city']].drop_duplicates())
+    assert db.query(func.count(models.DimManager.id)).scalar() == df['manager'].nunique()
+    assert db.query(func.count(models.DimSupplier.id)).scalar() == df['supplier_name'].nunique()
+    assert db.query(func.count(models.DimCategory.id)).scalar() == df['category'].nunique()
+    assert db.query(func.count(models.DimProduct.id)).scalar() == df['product_id'].nunique()
+    assert db.query(func.count(models.DimDate.id)).scalar() == df['date'].nunique()
+    db.close()
+
+
+def test_process_data_loads_facts_once():
+    print("Testing process_data end to end...")
+    engine, db = make_session()
+    df = sample_df()
+
+    result = etl.process_data(df.copy(), db)
+    print(f"First load: {result}")
+    assert result["rows_processed"] == len(df)
+    assert result["rows_inserted"] == len(df)
+
+    result = etl.process_data(df.copy(), db)
+    print(f"Second load: {result}")
+    assert result["rows_inserted"] == 0
+
+    product = db.query(models.DimProduct).filter_by(business_id=int(df['product_id'].iloc[0])).first()
+    assert product.category.name == df['category'].iloc[0]
+    db.close()
+
+
+def test_build_facts_is_columnar():
+    print("Testing vectorized fact builder...")
+    engine, db = make_session()
+    df = sample_df().head(50)
+    maps = etl.load_dimensions(df, db)
+
+    no_revenue = df.drop(columns=['revenue'])
+    facts = etl.build_facts(no_revenue, maps, existing_ids={int(df['sale_id'].iloc[0])})
+    assert list(facts.columns) == etl.FACT_COLUMNS
+    assert len(facts) == len(df) - 1
+    assert not facts[['date_id', 'product_id', 'manager_id', 'supplier_id', 'region_id']].isna().any().any()
+
+    row = df.iloc[1]
+    expected = row['quantity'] * row['unit_price'] - row['discount']
+    assert abs(facts['revenue'].iloc[0] - expected) < 1e-9
+    assert facts['region_id'].iloc[0] == maps['region'][(row['region_name'], row['city'])]
+    db.close()
+
+
+def test_chunked_load_matches_totals():
+    print("Testing chunked streaming load...")
+    engine, db = make_session()
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_sales_diverse.csv")
+
+    result = etl.process_chunks(pd.read_csv(path, chunksize=250), db)
+    print(f"Chunked load: {result}")
+    total = len(sample_df())
+    assert result["chunks"] == -(-total // 250)
+    assert result["rows_processed"] == total
+    assert result["rows_inserted"] == total
+    assert db.query(func.count(models.FactSales.id)).scalar() == total
+    db.close()
+
+
+def test_fact_writer_batches_inserts():
+    print("Testing bulk fact writer...")
+    engine, db = make_session()
+    df = sample_df()
+    maps = etl.load_dimensions(df, db)
+    facts = etl.build_facts(df, maps)
+
+    inserts = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: inserts.append(statement) if statement.startswith("INSERT") else None)
+    stats = fact_writer.write_facts(db, facts, batch_size=500)
+    db.commit()
+    print(f"Writer stats: {stats}")
+    assert stats["method"] == "insert_values"
+    assert stats["rows"] == len(df)
+    assert len(inserts) == 3
+    assert db.query(func.count(models.FactSales.id)).scalar() == len(df)
+    db.close()
+
+
+def test_existing_sale_ids_probes_only_batch_keys():
+    print("Testing database-side sale_id dedup...")
+    engine, db = make_session()
+    df = sample_df()
+    etl.process_data(df.head(100).copy(), db)
+
+    incoming = df['sale_id'].iloc[90:110].tolist()
+    found = fact_writer.existing_sale_ids(db, incoming)
+    assert found == set(df['sale_id'].iloc[90:100].tolist())
+
+    result = etl.process_data(df.iloc[90:110].copy(), db)
+    assert result["rows_inserted"] == 10
+    db.close()
+
+
+if __name__ == "__main__":
+    test_dimension_round_trips_are_constant()
+    test_process_data_loads_facts_once()
+    test_build_facts_is_columnar()
+    test_chunked_load_matches_totals()
+    test_fact_writer_batches_inserts()
+    test_existing_sale_ids_probes_only_batch_keys()
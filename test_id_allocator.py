@@ -0,0 +1,97 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+import etl
+import id_allocator
+import models
+import oltp_crud
+import schemas
+from test_etl_pipeline import make_session, sample_df
+
+
+def file_sessions():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ids.db')}")
+    models.Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def test_concurrent_allocators_never_collide():
+    print("Testing sale_id allocation...")
+    Session = file_sessions()
+    # Two allocators stand in for two app processes sharing one database
+    allocators = [id_allocator.IdAllocator("sale_id", id_allocator._max_sale_id, block_size=7) for _ in range(2)]
+
+    def allocate(i):
+        with Session() as db:
+            return [allocators[i % 2].next_id(db) for _ in range(25)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = [i for chunk in pool.map(allocate, range(16)) for i in chunk]
+    assert len(ids) == len(set(ids)) == 400
+    assert min(ids) == 1
+
+
+def test_allocation_starts_above_loaded_ids():
+    engine, db = make_session()
+    df = sample_df()
+    etl.process_data(df.iloc[:100].copy(), db)
+    first = id_allocator.sale_ids.next_id(db)
+    assert first > df['sale_id'].iloc[:100].max()
+
+    # Ids brought in by a later load are skipped, even inside the current block
+    etl.process_data(df.iloc[100:].copy(), db)
+    assert id_allocator.sale_ids.next_id(db) > df['sale_id'].max()
+    db.close()
+
+
+def test_transfer_reassigns_colliding_ids():
+    engine, db = make_session()
+    df = sample_df()
+    etl.process_data(df, db)
+    taken = int(df['sale_id'].iloc[0])
+    sale = models.OltpSale(
+        sale_id=taken, sale_datetime="2024-01-01 10:00:00", region_name="R", city="C", manager="M",
+        product_id=1, product_name="P", brand="B", category="X", supplier_name="S",
+        supplier_country="UA", quantity=1, unit_price=1, discount=0, revenue=1,
+        payment_type="cash", sales_channel="online", transferred=0,
+    )
+    db.add(sale)
+    db.commit()
+    result = oltp_crud.transfer_to_warehouse(db, [sale.id])
+    assert result["rows_inserted"] == 1
+    newest = db.query(func.max(models.FactSales.sale_id)).scalar()
+    assert newest > df['sale_id'].max()
+    db.close()
+
+
+def test_explicit_oltp_ids_are_never_reissued():
+    engine, db = make_session()
+    fields = dict(sale_datetime="2024-01-01 10:00:00", region_name="R", city="C", manager="M",
+                  product_id=1, product_name="P", category="X", supplier_name="S", quantity=1, unit_price=1)
+    auto = oltp_crud.create_oltp_sale(db, schemas.OltpSaleCreate(**fields))
+    explicit = oltp_crud.create_oltp_sale(db, schemas.OltpSaleCreate(sale_id=auto.sale_id + 1, **fields))
+    after = oltp_crud.create_oltp_sale(db, schemas.OltpSaleCreate(**fields))
+    assert after.sale_id > explicit.sale_id
+
+    # A sale_id repeated within one transfer gets a fresh id instead of being dropped
+    repeated = oltp_crud.create_oltp_sale(db, schemas.OltpSaleCreate(sale_id=explicit.sale_id, **fields))
+    ids = [auto.id, explicit.id, after.id, repeated.id]
+    result = oltp_crud.transfer_to_warehouse(db, ids)
+    assert result["rows_processed"] == result["rows_inserted"] == 4
+    assert db.query(func.count(models.FactSales.id)).scalar() == 4
+    assert db.query(func.count(models.OltpSale.id)).filter(models.OltpSale.transferred == 0).scalar() == 0
+    db.close()
+
+
+if __name__ == "__main__":
+    test_concurrent_allocators_never_collide()
+    test_allocation_starts_above_loaded_ids()
+    test_transfer_reassigns_colliding_ids()
+    test_explicit_oltp_ids_are_never_reissued()
@@ -0,0 +1,50 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import pandas as pd
+
+import ingest
+
+
+def sample_df():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_sales_diverse.csv")
+    return pd.read_csv(path).head(230)
+
+
+def spooled(df, suffix):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    if suffix == ".csv":
+        df.to_csv(path, index=False)
+    elif suffix == ".xlsx":
+        df.to_excel(path, index=False)
+    else:
+        df.to_parquet(path, index=False, row_group_size=100)
+    return path
+
+
+def test_read_frames_in_chunks():
+    print("Testing chunked upload readers...")
+    df = sample_df()
+    for suffix in (".csv", ".xlsx", ".parquet"):
+        path = spooled(df, suffix)
+        kind = ingest.file_kind("upload" + suffix)
+        frames = list(ingest.read_frames(path, kind, chunksize=100))
+        print(f"{kind}: {[len(f) for f in frames]}")
+        assert [len(f) for f in frames] == [100, 100, 30]
+        combined = pd.concat(frames, ignore_index=True)
+        assert list(combined.columns) == list(df.columns)
+        assert combined['sale_id'].tolist() == df['sale_id'].tolist()
+        assert not os.path.exists(path)
+
+
+def test_unknown_extension_rejected():
+    assert ingest.file_kind("report.pdf") is None
+    assert ingest.file_kind("SALES.CSV") == "csv"
+
+
+if __name__ == "__main__":
+    test_read_frames_in_chunks()
+    test_unknown_extension_rejected()
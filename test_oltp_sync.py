@@ -0,0 +1,163 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, func
+
+import fact_writer
+import models
+import oltp_crud
+import oltp_sync
+from test_etl_pipeline import make_session, sample_df
+
+
+def add_oltp_rows(db, df):
+    db.add_all([
+        models.OltpSale(
+            sale_id=int(r.sale_id), sale_datetime=r.sale_datetime, region_name=r.region_name, city=r.city,
+            manager=r.manager, product_id=int(r.product_id), product_name=r.product_name, brand=r.brand,
+            category=r.category, supplier_name=r.supplier_name, supplier_country=r.supplier_country,
+            quantity=int(r.quantity), unit_price=r.unit_price, discount=r.discount, revenue=r.revenue,
+            payment_type=r.payment_type, sales_channel=r.sales_channel, transferred=0,
+        )
+        for r in df.itertuples()
+    ])
+    db.commit()
+
+
+def facts(db):
+    rows = db.query(models.FactSales.sale_id, models.FactSales.quantity, models.FactSales.revenue) \
+        .order_by(models.FactSales.sale_id).all()
+    return [tuple(r) for r in rows]
+
+
+def test_sync_moves_rows_in_batches():
+    print("Testing watermark OLTP sync...")
+    engine, db = make_session()
+    add_oltp_rows(db, sample_df().iloc[:250])
+
+    result = oltp_sync.sync(db, batch_size=100)
+    assert result["batches"] == 3
+    assert result["rows_inserted"] == 250
+    assert db.query(func.count(models.FactSales.id)).scalar() == 250
+    assert db.query(func.count(models.OltpSale.id)).filter(models.OltpSale.transferred == 0).scalar() == 0
+    assert result["watermark"] == db.query(func.max(models.OltpSale.id)).scalar()
+
+    # Nothing new past the watermark: a rerun moves nothing
+    again = oltp_sync.sync(db, batch_size=100)
+    assert again["batches"] == 0 and again["rows_inserted"] == 0
+
+    # Only rows added since the last run are read
+    add_oltp_rows(db, sample_df().iloc[250:260])
+    assert oltp_sync.sync(db, batch_size=100)["rows_inserted"] == 10
+    db.close()
+
+
+def test_failed_batch_keeps_watermark_and_facts_together():
+    engine, db = make_session()
+    add_oltp_rows(db, sample_df().iloc[:200])
+    mark = oltp_crud.mark_transferred
+    calls = []
+
+    def failing(db, ids):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("boom")
+        mark(db, ids)
+
+    oltp_crud.mark_transferred = failing
+    try:
+        oltp_sync.sync(db, batch_size=100)
+        assert False, "second batch should fail"
+    except RuntimeError:
+        pass
+    finally:
+        oltp_crud.mark_transferred = mark
+
+    # The first batch committed whole, the second left no trace
+    assert db.query(func.count(models.FactSales.id)).scalar() == 100
+    first_ids = [r.id for r in db.query(models.OltpSale.id).order_by(models.OltpSale.id).limit(100)]
+    assert oltp_sync.watermark(db) == first_ids[-1]
+
+    assert oltp_sync.sync(db, batch_size=100)["rows_inserted"] == 100
+    assert db.query(func.count(models.FactSales.id)).scalar() == 200
+    db.close()
+
+
+def test_conflicts_are_retried_outside_max_batches():
+    print("Testing OLTP sync watermark conflicts...")
+    engine, db = make_session()
+    add_oltp_rows(db, sample_df().iloc[:200])
+    real = oltp_sync.sync_batch
+    conflicts = [2]
+
+    def conflicting(db, batch_size=None, after_id=None):
+        # Report a conflict as if another sync had moved the watermark
+        if conflicts[0]:
+            conflicts[0] -= 1
+            return {"rows_processed": 0, "rows_inserted": 0, "last_id": oltp_sync.watermark(db), "conflict": True}
+        return real(db, batch_size, after_id)
+
+    oltp_sync.sync_batch = conflicting
+    try:
+        result = oltp_sync.sync(db, batch_size=100, max_batches=2)
+        assert result["retries"] == 2 and result["batches"] == 2
+        assert result["rows_inserted"] == 200 and result["message"] == "Success"
+
+        # A sync that keeps losing the watermark stops at the retry cap
+        conflicts[0] = 100
+        stuck = oltp_sync.sync(db, batch_size=100, max_retries=3)
+        assert stuck["retries"] == 3 and stuck["batches"] == 0
+        assert stuck["message"] == "Stopped after 3 watermark conflicts"
+    finally:
+        oltp_sync.sync_batch = real
+    db.close()
+
+
+def test_transfer_splits_id_lists():
+    engine, db = make_session()
+    add_oltp_rows(db, sample_df().iloc[:120])
+    ids = [r.id for r in db.query(models.OltpSale.id)]
+    params = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "oltp_sales" in statement and not executemany:
+            params.append(len(parameters))
+
+    saved = fact_writer.MAX_BIND_PARAMS["sqlite"]
+    # Stands in for SQL Server's 2100 parameter limit
+    fact_writer.MAX_BIND_PARAMS["sqlite"] = 50
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = oltp_crud.transfer_to_warehouse(db, ids)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        fact_writer.MAX_BIND_PARAMS["sqlite"] = saved
+    assert result["rows_inserted"] == 120
+    assert params and max(params) <= 50
+    assert db.query(func.count(models.OltpSale.id)).filter(models.OltpSale.transferred == 0).scalar() == 0
+    db.close()
+
+
+def test_sync_matches_transfer():
+    df = sample_df().iloc[:150]
+    engine, synced = make_session()
+    add_oltp_rows(synced, df)
+    oltp_sync.sync(synced, batch_size=40)
+    expected = facts(synced)
+    synced.close()
+
+    engine, transferred = make_session()
+    add_oltp_rows(transferred, df)
+    ids = [r.id for r in transferred.query(models.OltpSale.id)]
+    oltp_crud.transfer_to_warehouse(transferred, ids)
+    assert facts(transferred) == expected
+    transferred.close()
+
+
+if __name__ == "__main__":
+    test_sync_moves_rows_in_batches()
+    test_failed_batch_keeps_watermark_and_facts_together()
+    test_conflicts_are_retried_outside_max_batches()
+    test_transfer_splits_id_lists()
+    test_sync_matches_transfer()
@@ -0,0 +1,81 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime
+
+import crud
+import etl
+import models
+import oltp_crud
+import pagination
+from test_etl_pipeline import make_session, sample_df
+
+
+def walk(fetch, limit):
+    """Every page forwards, then every page backwards from the last one."""
+    pages = [fetch(limit)]
+    while pages[-1].next_cursor:
+        pages.append(fetch(limit, after=pages[-1].next_cursor))
+    back = [pages[-1]]
+    while back[-1].prev_cursor:
+        back.append(fetch(limit, before=back[-1].prev_cursor))
+    return pages, list(reversed(back))
+
+
+def ids(pages):
+    return [item.id for page in pages for item in page.items]
+
+
+def test_sales_cursor_matches_offset():
+    print("Testing keyset pagination of sales...")
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+
+    for search in (None, "a"):
+        expected = [s.id for s in crud.get_sales(db, limit=10 ** 6, search=search)]
+        forward, backward = walk(
+            lambda limit, **c: crud.get_sales_page(db, limit=limit, search=search, **c), 37)
+        assert ids(forward) == expected
+        assert ids(backward) == expected
+        assert [len(p.items) for p in forward] == [len(p.items) for p in backward]
+        assert forward[0].prev_cursor is None
+
+    page = crud.get_sales_page(db, limit=5, skip=20)
+    assert [s.id for s in page.items] == [s.id for s in crud.get_sales(db, skip=20, limit=5)]
+    assert page.prev_cursor is not None
+    db.close()
+
+
+def test_oltp_cursor_newest_first():
+    engine, db = make_session()
+    for i in range(11):
+        db.add(models.OltpSale(
+            sale_id=i + 1, sale_datetime=datetime(2024, 1, 1), region_name="R", city="C", manager="M",
+            product_id=1, product_name="P", brand="B", category="X", supplier_name="S",
+            supplier_country="UA", quantity=1, unit_price=1, discount=0, revenue=1,
+            payment_type="cash", sales_channel="online", transferred=0,
+        ))
+    db.commit()
+    forward, backward = walk(lambda limit, **c: oltp_crud.get_oltp_sales_page(db, limit=limit, **c), 4)
+    assert ids(forward) == list(range(11, 0, -1))
+    assert ids(backward) == ids(forward)
+    db.close()
+
+
+def test_bad_cursor_rejected():
+    malformed = ("not-a-cursor", pagination.encode_cursor(1)[:-2] + "!!")
+    wrong_keys = [pagination.encode_cursor(k) for k in ([1], {"a": 1}, None, "abc", True, 1.5)]
+    for cursor in malformed + tuple(wrong_keys):
+        try:
+            pagination.decode_cursor(cursor)
+        except pagination.InvalidCursor:
+            pass
+        else:
+            raise AssertionError(f"accepted {cursor}")
+
+
+if __name__ == "__main__":
+    test_sales_cursor_matches_offset()
+    test_oltp_cursor_newest_first()
+    test_bad_cursor_rejected()
@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text, exc
+
+import database
+
+
+def test_pool_settings_from_env():
+    print("Testing pool settings...")
+    os.environ["DB_POOL_SIZE"] = "7"
+    os.environ["DB_ETL_POOL_SIZE"] = "2"
+    os.environ["DB_REPORTING_STATEMENT_TIMEOUT_MS"] = "5000"
+    try:
+        assert database.pool_setting("oltp", "POOL_SIZE") == 7
+        assert database.pool_setting("etl", "POOL_SIZE") == 2
+        assert database.pool_setting("etl", "POOL_PRE_PING") is True
+        assert database.pool_setting("etl", "APPLICATION_NAME") == "sales-analytics-etl"
+
+        options = database.engine_options("reporting", "postgresql+asyncpg://u:p@h/db", asynchronous=True)
+        assert options["pool_size"] == 7 and options["pool_pre_ping"]
+        assert options["connect_args"] == {"server_settings": {
+            "application_name": "sales-analytics-reporting", "statement_timeout": "5000"}}
+        options = database.engine_options("reporting", "postgresql://u:p@h/db")
+        assert options["connect_args"]["options"] == "-c statement_timeout=5000"
+        options = database.engine_options("etl", "mssql+pyodbc://u:p@h/db?driver=ODBC+Driver+17+for+SQL+Server")
+        assert options["url"].query["APP"] == "sales-analytics-etl"
+        # In-memory SQLite keeps its own single-connection pool
+        assert "pool_size" not in database.engine_options("etl", "sqlite://")
+    finally:
+        for name in ("DB_POOL_SIZE", "DB_ETL_POOL_SIZE", "DB_REPORTING_STATEMENT_TIMEOUT_MS"):
+            del os.environ[name]
+
+
+def test_pool_telemetry_counts_waits():
+    os.environ["DB_POOL_SIZE"] = "1"
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+    os.environ["DB_POOL_TIMEOUT"] = "1"
+    try:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool.db')}"
+        engine = create_engine(url, **database.engine_options("test", url))
+    finally:
+        for name in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_TIMEOUT"):
+            del os.environ[name]
+    database.POOLS["test"] = engine
+    try:
+        held = engine.connect()
+        released = threading.Event()
+
+        def release():
+            time.sleep(0.2)
+            held.close()
+            released.set()
+
+        threading.Thread(target=release).start()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        released.wait()
+
+        status = database.pool_status()["test"]
+        assert status["checkouts"] == 2
+        assert status["checked_out"] == 0 and status["checked_in"] == 1
+        assert status["wait_seconds_max"] >= 0.15
+
+        with engine.connect():
+            try:
+                engine.connect()
+                assert False, "pool should be exhausted"
+            except exc.TimeoutError:
+                pass
+            assert database.pool_status()["test"]["checked_out"] == 1
+        assert database.pool_status()["test"]["timeouts"] == 1
+    finally:
+        del database.POOLS["test"]
+        engine.dispose()
+
+
+def test_named_pools_are_separate():
+    assert database.engine is not database.etl_engine
+    assert database.SessionLocal.kw["bind"] is database.engine
+    assert database.EtlSessionLocal.kw["bind"] is database.etl_engine
+    assert {"oltp", "etl"} <= set(database.pool_status())
+
+
+if __name__ == "__main__":
+    test_pool_settings_from_env()
+    test_pool_telemetry_counts_waits()
+    test_named_pools_are_separate()
@@ -0,0 +1,122 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+import database
+import dim_cache
+import etl
+import models
+import result_cache
+from test_etl_pipeline import sample_df
+
+
+def request(headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+async def count_facts(req):
+    sessions = database.get_analytics_db(req)
+    db = await sessions.__anext__()
+    try:
+        return (await db.execute(select(func.count(models.FactSales.id)))).scalar()
+    finally:
+        await sessions.aclose()
+
+
+async def cached_count(req, calls):
+    """count_facts through the result cache, noting in calls when it was computed."""
+    async with database.analytics_sessionmaker(req)() as db:
+        async def compute():
+            calls.append(1)
+            return (await db.execute(select(func.count(models.FactSales.id)))).scalar()
+        return await result_cache.cache.get_or_compute_async(
+            "test/replica-count", {}, compute, replica=database.reads_replica(db))
+
+
+def primary_and_replica():
+    """Two SQLite files: the replica is a copy taken before the primary's second load."""
+    folder = tempfile.mkdtemp()
+    primary, replica = os.path.join(folder, "primary.db"), os.path.join(folder, "replica.db")
+    engine = create_engine(f"sqlite:///{primary}")
+    models.Base.metadata.create_all(bind=engine)
+    dim_cache.cache.invalidate()
+    df = sample_df()
+    with sessionmaker(bind=engine)() as db:
+        etl.process_data(df.iloc[:100].copy(), db)
+        shutil.copy(primary, replica)
+        etl.process_data(df.iloc[100:200].copy(), db)
+    engine.dispose()
+    return f"sqlite:///{primary}", f"sqlite:///{replica}"
+
+
+def configure(primary, replica, window):
+    database.ASYNC_DATABASE_URL = database.async_url(primary)
+    database.ANALYTICS_DATABASE_URL = replica
+    database.READ_YOUR_WRITES_SECONDS = window
+    database._async_engine = database._analytics_engine = None
+
+
+async def dispose():
+    for engine in {database._async_engine, database._analytics_engine} - {None}:
+        await engine.dispose()
+
+
+def test_analytics_reads_route_between_replica_and_primary():
+    print("Testing read replica routing...")
+    primary, replica = primary_and_replica()
+    saved = (database.ASYNC_DATABASE_URL, database.ANALYTICS_DATABASE_URL, database.READ_YOUR_WRITES_SECONDS,
+             database._async_engine, database._analytics_engine)
+
+    async def run():
+        configure(primary, replica, window=0.5)
+        assert await count_facts(request()) == 100
+
+        # Writes by the process (ETL, sync) keep other clients on the replica,
+        # but what they read there is not cached until the window has passed
+        etl.facts_committed(sessionmaker(bind=create_engine(primary))(), [1])
+        assert await count_facts(request()) == 100
+        assert await cached_count(request(), calls := []) == 100 and calls
+        assert await cached_count(request(), calls := []) == 100 and calls
+        time.sleep(0.6)
+        await cached_count(request(), [])
+        assert await cached_count(request(), calls := []) == 100 and not calls
+        # Nor are primary reads ever held back
+        database.get_async_engine()
+        assert not database.reads_replica(database.AsyncSessionLocal())
+
+        # A client that just wrote reads the primary, by header or cookie
+        assert await count_facts(request({"X-Last-Write": str(time.time())})) == 200
+        assert await count_facts(request({"Cookie": f"last_write={time.time()}"})) == 200
+        assert await count_facts(request({"X-Last-Write": str(time.time() - 60)})) == 100
+        assert await count_facts(request({"X-Last-Write": "garbage"})) == 100
+
+        await dispose()
+
+        # Without a replica every read goes to the primary
+        configure(primary, None, window=0)
+        assert await count_facts(request()) == 200
+        assert database._analytics_engine is database._async_engine
+        await dispose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        (database.ASYNC_DATABASE_URL, database.ANALYTICS_DATABASE_URL, database.READ_YOUR_WRITES_SECONDS,
+         database._async_engine, database._analytics_engine) = saved
+        database.AsyncSessionLocal.configure(bind=database._async_engine)
+        database.AnalyticsSessionLocal.configure(bind=database._analytics_engine)
+        database.POOLS.pop("analytics", None)
+
+
+if __name__ == "__main__":
+    test_analytics_reads_route_between_replica_and_primary()
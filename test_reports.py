@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func
+
+import etl
+import models
+import reports
+from test_etl_pipeline import make_session, sample_df
+
+
+def full_join_report(db, dim1, dim2, **filters):
+    """The original /reports/aggregate query, joining every dimension."""
+    col1 = reports.DIMENSIONS[dim1][0]
+    col2 = reports.DIMENSIONS[dim2][0]
+    q = db.query(col1, col2, func.sum(models.FactSales.revenue), func.count(models.FactSales.id)) \
+        .select_from(models.FactSales) \
+        .join(models.DimDate).join(models.DimProduct).join(models.DimRegion) \
+        .join(models.DimManager).join(models.DimSupplier) \
+        .join(models.DimCategory, models.DimProduct.category_id == models.DimCategory.id)
+    for name, value in filters.items():
+        q = q.filter(reports.FILTERS[name][0](value))
+    return {(r[0], r[1]): (float(r[2]), r[3]) for r in q.group_by(col1, col2).all()}
+
+
+def test_planner_joins_only_needed_tables():
+    facts = reports.FACTS
+    plan = reports.AggregatePlan(["year", "quarter"], ["revenue"], source=facts)
+    assert plan.joins == ["date"]
+    plan = reports.AggregatePlan(["year", "region"], ["count"], {"category": "Printers"}, source=facts)
+    assert plan.joins == ["date", "product", "region", "category"]
+    plan = reports.AggregatePlan(["manager", "supplier"], ["revenue"], {"date_from": "2024-01-01"}, source=facts)
+    assert plan.joins == ["date", "manager", "supplier"]
+
+
+def test_planner_prefers_rollup():
+    plan = reports.AggregatePlan(["year", "quarter"], ["revenue"])
+    assert plan.source is reports.ROLLUP
+    assert plan.joins == []
+    plan = reports.AggregatePlan(["region", "month"], ["count"], {"date_from": "2024-01-01", "date_to": "2024-03-31"})
+    assert plan.source is reports.ROLLUP
+    assert plan.joins == ["region"]
+    # Day-level date ranges and product need the fact table
+    assert reports.AggregatePlan(["year", "region"], ["revenue"], {"date_to": "2024-03-15"}).source is reports.FACTS
+    assert reports.AggregatePlan(["product", "year"], ["revenue"]).source is reports.FACTS
+
+
+def test_report_matches_full_join():
+    print("Testing aggregate report planner...")
+    engine, db = make_session()
+    df = sample_df()
+    etl.process_data(df, db)
+
+    cases = [
+        ("year", "quarter", {}),
+        ("region", "category", {}),
+        ("manager", "month", {"date_from": "2024-01-01", "date_to": "2024-06-30"}),
+        ("supplier", "product", {"category": df['category'].iloc[0]}),
+    ]
+    for dim1, dim2, filters in cases:
+        expected = full_join_report(db, dim1, dim2, **filters)
+        for source in (reports.FACTS, reports.ROLLUP):
+            if not source.supports([dim1, dim2], filters):
+                continue
+            rows = reports.aggregate_report(db, [dim1, dim2], "revenue,count,avg_check", source=source, **filters)
+            got = {(r["d1"], r["d2"]): (r["revenue"], r["count"]) for r in rows}
+            assert got.keys() == expected.keys()
+            for key, (revenue, count) in expected.items():
+                assert abs(got[key][0] - revenue) < 1e-6
+                assert got[key][1] == count
+            for r in rows:
+                assert r["value"] == r["revenue"]
+                assert abs(r["avg_check"] - r["revenue"] / r["count"]) < 1e-6
+    db.close()
+
+
+def test_unknown_metric_rejected():
+    try:
+        reports.parse_metrics("revenue,margin")
+    except ValueError as e:
+        assert "margin" in str(e)
+    else:
+        raise AssertionError("unknown metric accepted")
+
+
+if __name__ == "__main__":
+    test_planner_joins_only_needed_tables()
+    test_planner_prefers_rollup()
+    test_report_matches_full_join()
+    test_unknown_metric_rejected()
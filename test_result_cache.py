@@ -0,0 +1,61 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import time
+
+import etl
+import result_cache
+from test_etl_pipeline import make_session, sample_df
+
+
+def test_memory_backend_evicts_and_expires():
+    print("Testing in-process result cache...")
+    cache = result_cache.ResultCache(result_cache.MemoryBackend(max_bytes=4000, max_entries=10), ttl=60)
+    calls = []
+
+    def compute(n):
+        calls.append(n)
+        return list(range(n))
+
+    assert cache.get_or_compute("a", {"n": 10, "x": None}, lambda: compute(10)) == list(range(10))
+    assert cache.get_or_compute("a", {"n": 10, "x": ""}, lambda: compute(10)) == list(range(10))
+    assert calls == [10]
+    assert cache.stats()["hit_ratio"] == 0.5
+
+    for n in range(200, 210):
+        cache.get_or_compute("b", {"n": n}, lambda: compute(n))
+    assert cache.stats()["bytes_used"] <= 4000
+
+    cache.ttl = 0.01
+    cache.get_or_compute("c", {}, lambda: compute(1))
+    time.sleep(0.05)
+    cache.get_or_compute("c", {}, lambda: compute(1))
+    assert calls.count(1) == 2
+
+
+def test_generation_bump_invalidates_across_sqlite_backends():
+    print("Testing shared result cache...")
+    path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    first = result_cache.ResultCache(result_cache.SqliteBackend(path))
+    second = result_cache.ResultCache(result_cache.SqliteBackend(path))
+
+    first.get_or_compute("dashboard", {}, lambda: {"total": 1})
+    assert second.get_or_compute("dashboard", {}, lambda: {"total": 2}) == {"total": 1}
+    first.bump_generation()
+    assert second.get_or_compute("dashboard", {}, lambda: {"total": 3}) == {"total": 3}
+
+
+def test_etl_write_bumps_generation():
+    engine, db = make_session()
+    generation = result_cache.cache.backend.generation()
+    etl.process_data(sample_df().head(10), db)
+    assert result_cache.cache.backend.generation() > generation
+    db.close()
+
+
+if __name__ == "__main__":
+    test_memory_backend_evicts_and_expires()
+    test_generation_bump_invalidates_across_sqlite_backends()
+    test_etl_write_bumps_generation()
@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import select
+
+import crud
+import etl
+import fact_writer
+import models
+import rollups
+import schemas
+from test_etl_pipeline import make_session, sample_df
+
+
+def rollup_state(db):
+    table = models.AggSalesMonthly.__table__
+    rows = db.execute(select(table).order_by(*[table.c[g] for g in rollups.GRAIN])).mappings().all()
+    return [
+        {k: (round(float(v), 2) if k in ("revenue", "discount", "unit_price") else v)
+         for k, v in row.items() if k != "id"}
+        for row in rows
+    ]
+
+
+def test_incremental_rollup_matches_rebuild():
+    print("Testing rollup maintenance...")
+    engine, db = make_session()
+    df = sample_df()
+    etl.process_data(df.iloc[:700].copy(), db)
+    etl.process_data(df.iloc[500:].copy(), db)
+
+    sale = schemas.SaleCreate(
+        date=date(2024, 1, 1), product_id=1, manager_id=1, supplier_id=1, region_id=1,
+        quantity=3, unit_price=10, discount=1, payment_type="cash", sales_channel="online",
+    )
+    created = crud.create_sale(db, sale)
+    crud.update_sale(db, 5, sale.model_copy(update={"region_id": 2, "quantity": 7}))
+    crud.delete_sale(db, 9)
+    crud.delete_sale(db, created.id)
+
+    incremental = rollup_state(db)
+    rollups.rebuild(db)
+    rebuilt = rollup_state(db)
+    print(f"Rollup rows: {len(rebuilt)}")
+    assert incremental == rebuilt
+    assert sum(r["sale_count"] for r in rebuilt) == len(df) - 1
+    db.close()
+
+
+def test_ensure_built_fills_empty_rollup():
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+    db.query(models.AggSalesMonthly).delete()
+    db.commit()
+    assert rollups.ensure_built(db)
+    assert not rollups.ensure_built(db)
+    db.close()
+
+
+def test_mssql_merge_statements():
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+    facts = pd.DataFrame(db.execute(select(models.FactSales.__table__)).mappings().all())
+    rows = rollups._rows(rollups.fact_deltas(db, facts))
+    db.close()
+
+    class Recorder:
+        """Stands in for a SQL Server session, keeping what would be executed."""
+        statements = []
+
+        def execute(self, stmt, params):
+            self.statements.append((str(stmt), params))
+
+    rollups._upsert_merge(Recorder(), rows)
+    assert len(Recorder.statements) > 1
+    for sql, params in Recorder.statements:
+        assert sql.startswith("MERGE agg_sales_monthly WITH (HOLDLOCK)")
+        assert len(params) < fact_writer.MAX_BIND_PARAMS["mssql"]
+    assert sum(len(params) for _, params in Recorder.statements) == len(rows) * len(rollups.ROW_COLUMNS)
+
+
+if __name__ == "__main__":
+    test_incremental_rollup_matches_rebuild()
+    test_ensure_built_fills_empty_rollup()
+    test_mssql_merge_statements()
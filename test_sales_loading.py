@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+
+import crud
+import etl
+import schemas
+from test_etl_pipeline import make_session, sample_df
+
+
+def serialize(db, engine, fetch, schema):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    db.expunge_all()
+    try:
+        rows = [schema.model_validate(sale).model_dump() for sale in fetch()]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return rows, len(statements)
+
+
+def test_sales_page_query_count_is_constant():
+    print("Testing eager loading of sales pages...")
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+
+    for schema, names in ((schemas.Sale, False), (schemas.SaleWithNames, True)):
+        small, small_queries = serialize(db, engine, lambda: crud.get_sales_page(db, limit=5, names=names).items,
+                                         schema)
+        large, large_queries = serialize(db, engine, lambda: crud.get_sales_page(db, limit=100, names=names).items,
+                                         schema)
+        assert len(small) == 5 and len(large) == 100
+        assert small_queries == large_queries == 1
+        # Search adds its own index probes, but nothing per row
+        crud.get_sales(db, limit=1, search="a")
+        counted = [serialize(db, engine, lambda: crud.get_sales(db, limit=limit, search="a", names=names), schema)
+                   for limit in (5, 100)]
+        assert len(counted[1][0]) > len(counted[0][0])
+        assert counted[0][1] == counted[1][1]
+    db.close()
+
+
+def test_inline_names_match_dimensions():
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+    sale = crud.get_sales_page(db, limit=1, names=True).items[0]
+    row = schemas.SaleWithNames.model_validate(sale)
+    db.expunge_all()
+    lazy = crud.get_sale(db, sale.id)
+    assert row.product_name == lazy.product.name
+    assert row.category_name == lazy.product.category.name
+    assert row.manager_name == lazy.manager.name
+    assert row.supplier_name == lazy.supplier.name
+    assert (row.region_name, row.city) == (lazy.region.region_name, lazy.region.city)
+    assert row.date == lazy.dim_date.date
+    db.close()
+
+
+if __name__ == "__main__":
+    test_sales_page_query_count_is_constant()
+    test_inline_names_match_dimensions()
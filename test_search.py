@@ -0,0 +1,67 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import crud
+import dim_cache
+import etl
+import models
+import search
+from test_etl_pipeline import make_session, sample_df
+
+
+def ilike_ids(db, term):
+    query = crud._ilike_sales(db.query(models.FactSales.id), term)
+    return sorted(r[0] for r in query.all())
+
+
+def test_trigram_index_matches_substrings():
+    rows = [{"id": 1, "name": "Laptop Pro"}, {"id": 2, "name": "Desktop"}, {"id": 3, "name": None}]
+    index = search.TrigramIndex(rows, ("name",))
+    assert index.match("top") == {1, 2}
+    assert index.match("lap") == {1}
+    assert index.match("p") == {1, 2}
+    assert index.match("tablet") == set()
+
+
+def test_search_matches_ilike():
+    print("Testing indexed sales search...")
+    engine, db = make_session()
+    df = sample_df()
+    etl.process_data(df, db)
+
+    terms = ["a", "an", "KYIV", df['manager'].iloc[0][:5], df['product_name'].iloc[3][2:9].lower(),
+             df['city'].iloc[7], "zzzz-no-match"]
+    for term in terms:
+        assert search.search.match(db, term) is not None
+        expected = ilike_ids(db, term)
+        got = [s.id for s in crud.get_sales(db, limit=10 ** 6, search=term)]
+        assert got == expected, term
+        assert crud.get_sales_count(db, search=term) == len(expected)
+
+    # LIKE wildcards keep their SQL meaning through the fallback
+    assert search.search.match(db, "a_") is None
+    assert [s.id for s in crud.get_sales(db, limit=10 ** 6, search="a_")] == ilike_ids(db, "a_")
+    db.close()
+
+
+def test_search_sees_new_members():
+    engine, db = make_session()
+    etl.process_data(sample_df(), db)
+    assert crud.get_sales_count(db, search="Zanzibar") == 0
+
+    # Added behind the dimension cache's back, as another process would
+    db.add(models.DimRegion(id=999, region_name="Zanzibar", city="Stone Town"))
+    sale = db.query(models.FactSales).first()
+    sale.region_id = 999
+    db.commit()
+    version = dim_cache.cache.version
+    assert crud.get_sales_count(db, search="zanzibar") == 1
+    assert dim_cache.cache.version > version
+    db.close()
+
+
+if __name__ == "__main__":
+    test_trigram_index_matches_substrings()
+    test_search_matches_ilike()
+    test_search_sees_new_members()
@@ -0,0 +1,37 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+
+from fastapi.testclient import TestClient
+
+import etl_jobs
+import main
+
+
+def test_rejected_background_upload_removes_spooled_file():
+    print("Testing upload rejected by a full job queue...")
+    spool_dir = tempfile.mkdtemp()
+    saved_tempdir, saved_runner = tempfile.tempdir, etl_jobs.runner
+
+    class FullRunner:
+        def submit(self, *args, **kwargs):
+            raise etl_jobs.JobQueueFull("Too many ETL jobs in progress, try again later")
+
+    tempfile.tempdir = spool_dir
+    etl_jobs.runner = FullRunner()
+    try:
+        response = TestClient(main.app).post(
+            "/upload/sales?background=true",
+            files={"file": ("sales.csv", b"sale_id,quantity\n1,2\n", "text/csv")},
+        )
+    finally:
+        tempfile.tempdir, etl_jobs.runner = saved_tempdir, saved_runner
+
+    assert response.status_code == 429
+    assert os.listdir(spool_dir) == []
+
+
+if __name__ == "__main__":
+    test_rejected_background_upload_removes_spooled_file()